@@ -17,8 +17,15 @@ import uuid
 import datetime
 import time
 import traceback
+import tracemalloc
 import hashlib
-import xml.dom.minidom  # Added for pretty-printing XMLTV
+import urllib.request
+from xml.sax.saxutils import escape, quoteattr
+import copy
+import contextlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from schedule_engine import ScheduleEngine, ScheduleIndex, ScheduleIndexWriter, iter_m3u_entries, migrate_random_order, new_random_order, random_order_permutation
 try:
     import mysql.connector
 except ImportError:
@@ -128,6 +135,34 @@ def check_settings_lock():
         virtu_log(f"check_settings_lock: Error reading settings lock file: {str(e)}", virtu_logERROR)
         return None
 
+def replace_file(temp_path, target):
+    """Move a finished temp file over target, which readers then see whole or not at all."""
+    local_temp, local_target = xbmcvfs.translatePath(temp_path), xbmcvfs.translatePath(target)
+    if '://' not in local_target:
+        os.replace(local_temp, local_target)
+    elif not xbmcvfs.rename(temp_path, target):
+        # Not every VFS backend will rename over an existing file; a copy at least keeps the write
+        virtu_log(f"Could not rename {temp_path} over {target}, copying instead", virtu_logDEBUG)
+        if not xbmcvfs.copy(temp_path, target):
+            raise IOError(f"Failed to move {temp_path} to {target}")
+
+@contextlib.contextmanager
+def atomic_write(target):
+    """Open target for writing through a temp file in the same directory, renamed over it on success.
+
+    The temp file is written once, next to the target, so replacing it is a rename on the same filesystem
+    or share rather than a second full copy. If the block raises, target is left as it was.
+    """
+    directory, name = os.path.split(target)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}_{threading.get_ident()}.tmp")
+    try:
+        with xbmcvfs.File(temp_path, 'w') as f:
+            yield f
+        replace_file(temp_path, target)
+    finally:
+        if xbmcvfs.exists(temp_path):
+            xbmcvfs.delete(temp_path)
+
 def update_settings_lock(auto_regen=None):
     """Update virtuatv_settings.lock with current client auto_regen setting."""
     global shared_folder, INSTANCE_ID
@@ -147,16 +182,9 @@ def update_settings_lock(auto_regen=None):
                 'auto_regen': ADDON.getSettingBool('auto_regen') if auto_regen is None else auto_regen,
                 'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
             }
-            temp_lock = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_settings_lock_{os.getpid()}.json")
-            with xbmcvfs.File(temp_lock, 'w') as f:
+            with atomic_write(lock_file) as f:
                 f.write(json.dumps(data, indent=2))
-            if xbmcvfs.copy(temp_lock, lock_file):
-                xbmcvfs.delete(temp_lock)
-                virtu_log(f"update_settings_lock: Updated settings lock file for client {INSTANCE_ID}", virtu_logINFO)
-            else:
-                xbmcvfs.delete(temp_lock)
-                virtu_log(f"update_settings_lock: Failed to update settings lock file", virtu_logERROR)
-                return False
+            virtu_log(f"update_settings_lock: Updated settings lock file for client {INSTANCE_ID}", virtu_logINFO)
         else:
             virtu_log(f"update_settings_lock: Skipped update, lock file owned by client {current_data.get('client_id')}", virtu_logDEBUG)
         return True
@@ -252,6 +280,7 @@ class SettingsMonitor(xbmc.Monitor):
         LOG_LEVEL = LOG_LEVEL_MAP.get(ADDON.getSetting('log_level'), 'info')
         LOG_VERBOSE = LOG_LEVEL == 'verbose'
         LOG_INFO = LOG_LEVEL == 'info' or LOG_VERBOSE
+        DB_POOL.reset()
 
 settings_monitor = SettingsMonitor()  # Instantiate SettingsMonitor to enable onSettingsChanged callback
         
@@ -285,6 +314,7 @@ def main_menu():
             channel.m3u_path = os.path.join(storage_path, f"VirtuaTV_Channel_{ch['number']}_{''.join(c for c in ch['name'] if c.isalnum() or c in (' ', '_', '-')).replace(' ', '_')}.m3u")
             if channel.set_playlist(channel.m3u_path):
                 channel.is_valid = True
+                channel.tune_to_time(time.time())
                 valid_channels.append(channel)
         if not valid_channels:
             if xbmcgui.Dialog().yesno("VirtuaTV", "No valid channels found. Create channels or open settings?", yeslabel="Create", nolabel="Settings"):
@@ -344,8 +374,27 @@ def suggest_channel_number():
         number += 1
     return number
     
-def load_channels():
-    """Load channels from channels.json, handling errors robustly."""
+CHANNELS_SNAPSHOT = {'content': None, 'size': -1, 'mtime': None}  # channels.json as this process last read or wrote it
+
+def remember_channels_content(content):
+    """Record content as what channels.json holds now, along with the file's size and mtime."""
+    stat = xbmcvfs.Stat(CHANNELS_FILE)
+    CHANNELS_SNAPSHOT['content'] = content
+    CHANNELS_SNAPSHOT['size'] = stat.st_size()
+    CHANNELS_SNAPSHOT['mtime'] = stat.st_mtime()
+
+def channels_file_unchanged():
+    """Whether channels.json still has the size and mtime it had when this process last read or wrote it."""
+    if not xbmcvfs.exists(CHANNELS_FILE):
+        return False
+    stat = xbmcvfs.Stat(CHANNELS_FILE)
+    return stat.st_size() == CHANNELS_SNAPSHOT['size'] and stat.st_mtime() == CHANNELS_SNAPSHOT['mtime']
+
+def load_channels(save_migrations=True):
+    """Load channels from channels.json, handling errors robustly.
+
+    Channels missing an id are fixed up in memory and, unless save_migrations is False, saved back.
+    """
     channels = []
     channels_file = xbmcvfs.translatePath("special://profile/addon_data/plugin.video.virtuatv/channels.json")
     if not xbmcvfs.exists(channels_file):
@@ -355,6 +404,7 @@ def load_channels():
         with xbmcvfs.File(channels_file, 'r') as f:
             content = f.read()
             virtu_log(f"VirtuaTV: Raw channels.json content: {content}", virtu_logDEBUG)
+            remember_channels_content(content)
             if not content.strip():
                 virtu_log(f"VirtuaTV: channels.json is empty at {channels_file}", virtu_logWARNING)
                 return channels
@@ -380,10 +430,21 @@ def load_channels():
                         playlist['random_order'] = {}
                     if 'last_index' not in playlist:
                         playlist['last_index'] = {}
-            if modified:
+                    for item_name, order in list(playlist['random_order'].items()):
+                        if isinstance(order, list):
+                            # Older versions stored the whole shuffled index list
+                            seeded, last_index = migrate_random_order(order, playlist['last_index'].get(item_name))
+                            if seeded is None:
+                                del playlist['random_order'][item_name]
+                            else:
+                                playlist['random_order'][item_name] = seeded
+                                playlist['last_index'][item_name] = last_index
+                            modified = True
+            if modified and save_migrations:
                 save_channels(channels)
-                virtu_log("VirtuaTV: Added missing channel IDs, flagged for regeneration, and saved channels.json", virtu_logINFO)
-            virtu_log(f"VirtuaTV: Loaded {len(channels)} channels from {channels_file}: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
+                virtu_log("VirtuaTV: Added missing channel IDs or migrated random_order lists and saved channels.json", virtu_logINFO)
+            if LOG_VERBOSE:
+                virtu_log(f"VirtuaTV: Loaded {len(channels)} channels from {channels_file}: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
     except json.JSONDecodeError as e:
         virtu_log(f"VirtuaTV: JSON error in channels.json: {str(e)}, content: {content}", virtu_logERROR)
         if xbmcvfs.exists(channels_file + '.bak'):
@@ -398,97 +459,13 @@ def load_channels():
     return channels
     
 def save_channels(channels):
-    """Save channels to channels.json with horizontal formatting for random_order and last_index lists."""
-    def compact_random_order(json_str):
-        lines = json_str.splitlines()
-        output = []
-        i = 0
-        in_random_order = False
-        in_list = False
-        list_buffer = []
-        key_line = None
-        has_comma = False
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-            if '"random_order": {' in stripped:
-                in_random_order = True
-            if in_random_order and '}' in stripped:
-                in_random_order = False
-            if in_list:
-                if stripped.startswith(']'):
-                    compact_list = '[' + ','.join(list_buffer) + ']'
-                    if stripped.endswith(','):
-                        compact_list += ','
-                        has_comma = True
-                    else:
-                        has_comma = False
-                    output.append(key_line.replace('[', compact_list))
-                    in_list = False
-                    list_buffer = []
-                    key_line = None
-                    i += 1
-                    continue
-                else:
-                    num = stripped.rstrip(',')
-                    list_buffer.append(num)
-                i += 1
-                continue
-            else:
-                if in_random_order and stripped.endswith('": ['):
-                    in_list = True
-                    key_line = line
-                    i += 1
-                    continue
-                output.append(line)
-            i += 1
-        return '\n'.join(output)
-    def compact_last_index(json_str):
-        lines = json_str.splitlines()
-        output = []
-        i = 0
-        in_last_index = False
-        in_list = False
-        list_buffer = []
-        key_line = None
-        has_comma = False
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-            if '"last_index": {' in stripped:
-                in_last_index = True
-            if in_last_index and '}' in stripped:
-                in_last_index = False
-            if in_list:
-                if stripped.startswith(']'):
-                    compact_list = '[' + ','.join(list_buffer) + ']'
-                    if stripped.endswith(','):
-                        compact_list += ','
-                        has_comma = True
-                    else:
-                        has_comma = False
-                    output.append(key_line.replace('[', compact_list))
-                    in_list = False
-                    list_buffer = []
-                    key_line = None
-                    i += 1
-                    continue
-                else:
-                    num = stripped.rstrip(',')
-                    list_buffer.append(num)
-                i += 1
-                continue
-            else:
-                if in_last_index and stripped.endswith('": ['):
-                    in_list = True
-                    key_line = line
-                    i += 1
-                    continue
-                output.append(line)
-            i += 1
-        return '\n'.join(output)
+    """Save channels to channels.json, skipping the write when nothing changed since it was last read or written.
+
+    Callers batch their changes and save once per operation, so this is the only place channels.json is written.
+    """
     try:
-        virtu_log(f"VirtuaTV: Attempting to save {len(channels)} channels: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
+        if LOG_VERBOSE:
+            virtu_log(f"VirtuaTV: Attempting to save {len(channels)} channels: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
         if not isinstance(channels, list):
             virtu_log(f"VirtuaTV: Invalid channels data: not a list", virtu_logERROR)
             return False
@@ -510,7 +487,7 @@ def save_channels(channels):
                     virtu_log(f"VirtuaTV: Invalid random_order in playlist {playlist['path']}: {random_order}", virtu_logERROR)
                     return False
                 for key, value in random_order.items():
-                    if not isinstance(value, list):
+                    if not isinstance(value, dict) or not isinstance(value.get('seed'), int) or not isinstance(value.get('length'), int):
                         virtu_log(f"VirtuaTV: Invalid random_order value for {key} in playlist {playlist['path']}: {value}", virtu_logERROR)
                         return False
                 last_index = playlist.get('last_index', {})
@@ -522,6 +499,11 @@ def save_channels(channels):
                         virtu_log(f"VirtuaTV: Invalid last_index value for {key} in playlist {playlist['path']}: {value}", virtu_logERROR)
                         return False
         channels_file = xbmcvfs.translatePath("special://profile/addon_data/plugin.video.virtuatv/channels.json")
+        content = json.dumps(channels, indent=2)
+        # Another process, or a sync from the shared folder, may have replaced the file since, even at the same size
+        if content == CHANNELS_SNAPSHOT['content'] and channels_file_unchanged():
+            virtu_log(f"VirtuaTV: channels.json unchanged, skipping save", virtu_logDEBUG)
+            return True
         lock_file = channels_file + '.lock'
         if xbmcvfs.exists(lock_file):
             stat = xbmcvfs.Stat(lock_file)
@@ -543,20 +525,11 @@ def save_channels(channels):
             if not xbmcvfs.exists(profile_dir):
                 xbmcvfs.mkdirs(profile_dir)
                 virtu_log(f"VirtuaTV: Created profile directory: {profile_dir}", virtu_logINFO)
-            temp_file = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_channels_{os.getpid()}.json")
-            content = json.dumps(channels, indent=2)
-            content = compact_random_order(content)
-            content = compact_last_index(content)
-            with xbmcvfs.File(temp_file, 'w') as f:
+            with atomic_write(channels_file) as f:
                 f.write(content)
-            if xbmcvfs.copy(temp_file, channels_file):
-                xbmcvfs.delete(temp_file)
-                virtu_log(f"VirtuaTV: Saved {len(channels)} channels to {channels_file}", virtu_logINFO)
-                return True
-            else:
-                virtu_log(f"VirtuaTV: Failed to copy temp file to {channels_file}", virtu_logERROR)
-                xbmcvfs.delete(temp_file)
-                return False
+            remember_channels_content(content)
+            virtu_log(f"VirtuaTV: Saved {len(channels)} channels to {channels_file}", virtu_logINFO)
+            return True
         finally:
             xbmcvfs.delete(lock_file)
     except Exception as e:
@@ -565,18 +538,343 @@ def save_channels(channels):
         return False
 
 
+M3U_WRITE_BATCH = 500
+COMPACT_MIN_PLAYED_SHARE = 0.25  # share of an oversized M3U that must have aired before it is compacted
+DIRECTORY_LISTING_TTL = 600  # seconds a parent directory listing answers existence checks
+DIRECTORY_LISTINGS = {}  # parent directory -> (listed at, file names present, file names confirmed missing)
+DIRECTORY_LISTINGS_LOCK = threading.Lock()
+LISTABLE_PATH_PATTERN = re.compile(r'^(?:[a-z]:[\\/]|[\\/]|(?:smb|nfs|upnp|ftp|sftp|davs?|special)://)', re.IGNORECASE)
+
+def file_exists_cached(file_path):
+    """Check a media file through a listing of its parent directory instead of one VFS round trip per file.
+
+    Each directory is listed once per DIRECTORY_LISTING_TTL. A name missing from the listing is confirmed
+    with xbmcvfs.exists once (listings can differ in encoding or be empty on some sources) and the answer
+    is remembered. Paths that cannot be listed, like plugin:// or stack://, go straight to xbmcvfs.exists.
+    """
+    split = max(file_path.rfind('/'), file_path.rfind('\\'))
+    if split < 0 or not LISTABLE_PATH_PATTERN.match(file_path):
+        return xbmcvfs.exists(file_path)
+    parent, name = file_path[:split + 1], file_path[split + 1:]
+    now = time.time()
+    with DIRECTORY_LISTINGS_LOCK:
+        listing = DIRECTORY_LISTINGS.get(parent)
+    if listing is None or now - listing[0] > DIRECTORY_LISTING_TTL:
+        try:
+            files = set(xbmcvfs.listdir(parent)[1])
+        except Exception as e:
+            virtu_log(f"Could not list {parent} for existence checks: {str(e)}", virtu_logDEBUG)
+            files = set()
+        listing = (now, files, set())
+        with DIRECTORY_LISTINGS_LOCK:
+            DIRECTORY_LISTINGS[parent] = listing
+    _, files, missing = listing
+    if name in files:
+        return True
+    if name in missing:
+        return False
+    if xbmcvfs.exists(file_path):
+        files.add(name)
+        return True
+    missing.add(name)
+    return False
+
+def write_m3u_entries(f, entries, base_playlist, channel_name, index_writer=None):
+    """Write schedule entries to an open M3U file as they are produced, in batches of M3U_WRITE_BATCH,
+    so a long horizon never has to be held in memory. Each entry written is also added to index_writer,
+    if given. Returns the number of entries written and their total duration."""
+    batch = []
+    count = 0
+    total_duration = 0
+    missing_files = {}
+    for item_name, item in entries:
+        if not isinstance(item, dict) or 'title' not in item or 'file' not in item:
+            virtu_log(f"VirtuaTV: Invalid item in interleaved track for channel {channel_name}: {item}", virtu_logWARNING)
+            continue
+        duration = item.get('duration', 0)
+        if duration <= 0:
+            virtu_log(f"VirtuaTV: Skipping item {item['title']} with invalid duration {duration}", virtu_logWARNING)
+            continue
+        file_path = item['file']
+        if not file_exists_cached(file_path):
+            missing_files[file_path] = missing_files.get(file_path, 0) + 1
+            continue
+        title = item['title']
+        description = base_playlist['items'].get(item_name, {}).get('description', '')
+        season_episode = f"S{item.get('season', 0):02d}E{item.get('episode', 0):02d}" if base_playlist['type'] == 'episodes' and 'season' in item and 'episode' in item else ''
+        entry_title = f"{item_name}//{title} ({season_episode})//{description}" if season_episode else f"{item_name}//{title}//{description}"
+        entry = f'#EXTINF:{int(duration)},{entry_title}\n{file_path}\n'
+        batch.append(entry)
+        count += 1
+        total_duration += int(duration)
+        if index_writer is not None:
+            index_writer.add(int(duration), entry_title, len(entry.encode('utf-8')))
+        if len(batch) >= M3U_WRITE_BATCH:
+            f.write(''.join(batch))
+            batch = []
+    if batch:
+        f.write(''.join(batch))
+    if missing_files:
+        skipped = sum(missing_files.values())
+        virtu_log(f"VirtuaTV: Skipped {skipped} entries for {len(missing_files)} inaccessible files in channel {channel_name}: {', '.join(list(missing_files)[:20])}{' ...' if len(missing_files) > 20 else ''}", virtu_logWARNING)
+        xbmcgui.Dialog().notification("VirtuaTV", f"{len(missing_files)} inaccessible files skipped in channel {channel_name}", xbmcgui.NOTIFICATION_WARNING, 3000)
+    return count, total_duration
+
+def append_m3u_entries(m3u_filename, entries, base_playlist, channel_name, index_writer=None):
+    """Append schedule entries to the end of an existing channel M3U, leaving everything before them untouched.
+
+    Local files are opened in append mode. xbmcvfs.File cannot append, so network targets are rewritten
+    through atomic_write instead, which costs a read and a write of the whole file on every refill.
+    A file that doesn't end with a newline gets one first, so the first new #EXTINF starts its own line.
+    index_writer and the return value are as for write_m3u_entries.
+    """
+    local_path = xbmcvfs.translatePath(m3u_filename)
+    if '://' not in local_path and os.path.isfile(local_path):
+        with open(local_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 1, 0))
+            last_byte = f.read(1)
+        with open(local_path, 'a', encoding='utf-8', newline='') as f:
+            if last_byte not in (b'', b'\n'):
+                f.write('\n')
+                if index_writer is not None:
+                    index_writer.pad(1)
+            return write_m3u_entries(f, entries, base_playlist, channel_name, index_writer)
+    virtu_log(f"{m3u_filename} is not a local file and xbmcvfs cannot append, so this refill rewrites all {xbmcvfs.Stat(m3u_filename).st_size()} bytes of it", virtu_logINFO)
+    with xbmcvfs.File(m3u_filename, 'r') as f:
+        existing = f.read()
+    with atomic_write(m3u_filename) as f:
+        f.write(existing)
+        if existing and not existing.endswith('\n'):
+            f.write('\n')
+            if index_writer is not None:
+                index_writer.pad(1)
+        return write_m3u_entries(f, entries, base_playlist, channel_name, index_writer)
+
+def compact_m3u(m3u_filename, schedule_index, played_count):
+    """Drop the first played_count entries from a channel M3U and its schedule index.
+
+    This is the one rewrite Safe Append Mode allows, run when the file crosses rebuild_size_mb. Cursors
+    are untouched, so the schedule carries on exactly where it was. Returns the trimmed index, anchored
+    where the first kept entry starts, or None if the file was left as it was.
+    """
+    try:
+        # The index knows where every entry starts, so the kept tail is copied without parsing it
+        with xbmcvfs.File(m3u_filename) as f:
+            f.seek(schedule_index.positions[played_count], 0)
+            tail = bytes(f.readBytes())
+        anchor = schedule_index.anchor + schedule_index.offsets[played_count]
+        with schedule_index_writer(m3u_filename, anchor, len(b'#EXTM3U\n')) as index_writer, atomic_write(m3u_filename) as f:
+            f.write(bytearray(b'#EXTM3U\n' + tail))
+            index_writer.add_index(schedule_index, played_count)
+        return read_schedule_index(m3u_filename)
+    except Exception as e:
+        virtu_log(f"Error compacting {m3u_filename}: {str(e)}", virtu_logERROR)
+        return None
+
+def get_schedule_index_file(m3u_filename):
+    """Binary sidecar next to a channel M3U holding its ScheduleIndex."""
+    return os.path.splitext(m3u_filename)[0] + '.idx'
+
+@contextlib.contextmanager
+def schedule_index_writer(m3u_filename, anchor, start_position):
+    """ScheduleIndexWriter streaming into the sidecar of a channel M3U, which is replaced once the block completes.
+
+    The M3U must be complete when the block ends, since the index records its modification time.
+    """
+    with atomic_write(get_schedule_index_file(m3u_filename)) as f:
+        index_writer = ScheduleIndexWriter(f.write, anchor, start_position)
+        yield index_writer
+        index_writer.m3u_mtime = xbmcvfs.Stat(m3u_filename).st_mtime()
+        index_writer.close()
+
+def read_file_bytes(path):
+    with xbmcvfs.File(path) as f:
+        return bytes(f.readBytes())
+
+def read_schedule_index(m3u_filename):
+    return ScheduleIndex.decode(read_file_bytes(get_schedule_index_file(m3u_filename)))
+
+def rebuild_schedule_index(m3u_filename, anchor):
+    """Index a channel M3U from its contents, streamed rather than read whole, and store it as the sidecar.
+    Returns the index, or None if the M3U can't be read."""
+    try:
+        with xbmcvfs.File(m3u_filename) as f:
+            entries = iter_m3u_entries(f.readBytes)
+            first = next(entries, None)
+            start_position = first.position if first else xbmcvfs.Stat(m3u_filename).st_size()
+            with schedule_index_writer(m3u_filename, anchor, start_position) as index_writer:
+                if first:
+                    for entry in itertools.chain([first], entries):
+                        index_writer.add(entry.duration, entry.title, entry.size)
+        index = read_schedule_index(m3u_filename)
+    except Exception as e:
+        virtu_log(f"Error indexing {m3u_filename}: {str(e)}", virtu_logWARNING)
+        return None
+    virtu_log(f"Rebuilt schedule index for {m3u_filename} from {len(index)} M3U entries", virtu_logDEBUG)
+    return index
+
+def load_schedule_index(m3u_filename):
+    """ScheduleIndex saved for a channel M3U, or None if there is none.
+
+    An index whose recorded M3U size or modification time no longer matches the file is rebuilt from
+    the M3U under the same anchor, so a rewrite to the same length is noticed too.
+    """
+    index_file = get_schedule_index_file(m3u_filename)
+    try:
+        if not xbmcvfs.exists(m3u_filename) or not xbmcvfs.exists(index_file):
+            return None
+        index = read_schedule_index(m3u_filename)
+        stat = xbmcvfs.Stat(m3u_filename)
+        if index.m3u_size != stat.st_size() or index.m3u_mtime != stat.st_mtime():
+            virtu_log(f"Schedule index {index_file} is stale, rebuilding it", virtu_logDEBUG)
+            return rebuild_schedule_index(m3u_filename, index.anchor)
+        return index
+    except Exception as e:
+        virtu_log(f"Error reading schedule index {index_file}: {str(e)}", virtu_logWARNING)
+        return None
+
+def build_channel_playlists(channel, dialog, timings=None, progress_dialog=None, dry_run=False):
+    """Resolve and order every playlist of a channel into the structure ScheduleEngine consumes.
+
+    Cursor and random_order state is read from and refreshed in channel['playlists']. When timings is
+    a dict, the seconds spent on each playlist that resolved are recorded in it by playlist path.
+    A progress_dialog, if given, is moved along as each playlist loads. A dry_run reads the playlist
+    cache but never writes it, and neither logs missing durations nor shows notifications or dialogs.
+    Show metadata and durations looked up for one playlist are reused by the others in the same build.
+    """
+    channel_name = channel['name']
+    playlists = channel.get('playlists', [])
+    all_playlists = []
+    conn, cursor, db_type, fingerprint = None, None, None, None
+    lookup_cache = {}
+    if any(playlist.get('source', 'playlist') == 'playlist' for playlist in playlists):
+        conn, cursor, db_type, _ = get_database_connection()
+        fingerprint = get_library_fingerprint(cursor)
+    for playlist_idx, playlist in enumerate(playlists):
+        started = time.perf_counter()
+        playlist_type = playlist.get('playlist_type')
+        source = playlist.get('source', 'playlist')
+        if progress_dialog is not None:
+            progress_dialog.update(int(playlist_idx / len(playlists) * 100), f"Loading Playlist {playlist_idx}: {os.path.basename(playlist['path'])}")
+        virtu_log(f"VirtuaTV: Processing Playlist {playlist_idx} as {playlist_type} (source: {source})", virtu_logDEBUG)
+        metadata = {}
+        if source == 'playlist':
+            try:
+                items, rule_order, is_random, metadata = resolve_playlist(playlist['path'], playlist_type, cursor, db_type, fingerprint, dry_run=dry_run, lookup_cache=lookup_cache)
+            except Exception as e:
+                virtu_log(f"VirtuaTV: Error looking up metadata for Playlist {playlist_idx}: {str(e)}", virtu_logERROR)
+                if not dry_run:
+                    dialog.notification("VirtuaTV", f"Failed to group items for playlist {playlist['path']}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
+                    time.sleep(0.1)
+                continue
+        else:
+            items, rule_order, is_random = get_playlist_items_with_durations(playlist['path'], playlist_type, source=source, quiet=dry_run)
+        if not items:
+            virtu_log(f"VirtuaTV: No items found for Playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
+            if not dry_run:
+                dialog.notification("VirtuaTV", f"No items found for playlist {playlist['path']} in channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
+                time.sleep(0.1)
+            continue
+        is_one_match = False
+        if source == 'playlist':
+            try:
+                is_one_match = load_smart_playlist(playlist['path']).match == 'one'
+            except Exception as e:
+                virtu_log(f"VirtuaTV: Error parsing playlist for match type: {str(e)}", virtu_logERROR)
+        item_groups = {}
+        if source == 'playlist' and not metadata:
+            virtu_log(f"VirtuaTV: No show metadata for Playlist {playlist_idx}, grouping by show title from JSON-RPC", virtu_logWARNING)
+        for item in items:
+            if not isinstance(item, dict) or 'file' not in item:
+                virtu_log(f"VirtuaTV: Invalid item in Playlist {playlist_idx}: {item}", virtu_logWARNING)
+                continue
+            try:
+                filename = os.path.basename(item['file'])
+                item_name = item.get('showtitle') or item.get('title') or os.path.basename(item['file'])
+                item_description = item.get('plot', '')
+                item_categories = item.get('genre', [])
+                item_date = item.get('year', '')
+                item_icon = item.get('thumbnail', '')
+                if source == 'playlist':
+                    result = metadata.get(item['file'])
+                    if result:
+                        item_name, item_description, item_categories, item_date = result
+                        item_categories = item_categories.split(',') if item_categories else ['Unknown']
+                    else:
+                        virtu_log(f"VirtuaTV: No {'TV show' if playlist_type == 'episodes' else 'movie'} information found for {filename} in Playlist {playlist_idx}. Using title or filename: {item_name}", virtu_logWARNING)
+                else:
+                    item_name = os.path.basename(playlist['path']) if playlist_type == 'episodes' else item['title']
+                    item_categories = ['Unknown'] if not item_categories else item_categories
+                if item_name not in item_groups:
+                    item_groups[item_name] = {'items': [], 'description': item_description, 'categories': item_categories, 'date': item_date, 'icon': item_icon}
+                if item_name not in playlist['last_index']:
+                    playlist['last_index'][item_name] = -1
+                item_groups[item_name]['items'].append(item)
+                virtu_log(f"VirtuaTV: Added item {filename} to Playlist {playlist_idx} item {item_name}", virtu_logDEBUG)
+            except Exception as e:
+                virtu_log(f"VirtuaTV: Error processing item {item} in Playlist {playlist_idx}: {str(e)}", virtu_logERROR)
+                continue
+        if not item_groups:
+            virtu_log(f"VirtuaTV: No valid {'episodes' if playlist_type == 'episodes' else 'movies'} found for Playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
+            if not dry_run:
+                dialog.notification("VirtuaTV", f"No valid items found for playlist {playlist['path']} in channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
+                time.sleep(0.1)
+            continue
+        sorted_item_groups = {}
+        ordered_shows = rule_order if rule_order else list(item_groups.keys())
+        if source == 'playlist' and is_random and playlist_type == 'episodes' and is_one_match:
+            random.shuffle(ordered_shows)
+            virtu_log(f"VirtuaTV: Randomized show order for Playlist {playlist_idx} (<match>one</match>): {ordered_shows}", virtu_logDEBUG)
+        elif playlist.get('fixed_show_order'):
+            ordered_shows = [show for show in playlist['fixed_show_order'] if show in item_groups]
+            virtu_log(f"VirtuaTV: Using fixed show order for Playlist {playlist_idx}: {ordered_shows}", virtu_logINFO)
+        elif playlist.get('shuffle_shows', False):
+            random.shuffle(ordered_shows)
+            virtu_log(f"VirtuaTV: Shuffled show order for Playlist {playlist_idx}: {ordered_shows}", virtu_logDEBUG)
+        for item_name in ordered_shows:
+            if item_name in item_groups:
+                sorted_item_groups[item_name] = item_groups[item_name]
+                if playlist_type == 'episodes' and source == 'playlist' and is_random:
+                    group_size = len(item_groups[item_name]['items'])
+                    permutation = random_order_permutation(playlist['random_order'].get(item_name), group_size)
+                    if permutation is None:
+                        playlist['random_order'][item_name] = new_random_order(group_size)
+                        virtu_log(f"VirtuaTV: Generated random order for {item_name} in Playlist {playlist_idx}: {playlist['random_order'][item_name]}", virtu_logINFO)
+                        permutation = random_order_permutation(playlist['random_order'][item_name], group_size)
+                    sorted_item_groups[item_name]['items'] = [
+                        sorted_item_groups[item_name]['items'][i] for i in permutation
+                    ]
+                elif playlist_type == 'episodes' and source == 'playlist':
+                    sorted_item_groups[item_name]['items'].sort(key=lambda x: (int(x.get('season', 1)), int(x.get('episode', 1))))
+                virtu_log(f"VirtuaTV: Playlist {playlist_idx} item {item_name} has {len(sorted_item_groups[item_name]['items'])} {'episodes' if playlist_type == 'episodes' else 'movies'}", virtu_logINFO)
+        all_playlists.append({
+            'items': sorted_item_groups,
+            'interleave': playlist.get('interleave', {'low': 1, 'high': 1, 'count': 1}),
+            'last_index': playlist['last_index'],
+            'random_order': playlist['random_order'],
+            'type': playlist_type,
+            'path': playlist['path'],
+            'is_random': is_random,
+            'shuffle_shows': playlist.get('shuffle_shows', False)
+        })
+        if timings is not None:
+            timings[playlist['path']] = time.perf_counter() - started
+    if conn:
+        cursor.close()
+        conn.close()
+    return all_playlists
+
 # Replace your existing generate_channel_files function with this version
-def generate_channel_files(channel_number):
-    """Generate M3U for the specified channel with optimized non-blocking notifications."""
-    def get_episode_count(filename):
-        match = re.search(r'S(\d{2})E(\d{2})-?E?(\d{2})?', filename, re.IGNORECASE)
-        if match and match.group(3):
-            start_ep = int(match.group(2))
-            end_ep = int(match.group(3))
-            return end_ep - start_ep + 1
-        return 1
+def generate_channel_files(channel_number, channels=None):
+    """Generate M3U for the specified channel with optimized non-blocking notifications.
+
+    When channels is passed the channel is built in that list and the caller saves it.
+    """
     dialog = xbmcgui.Dialog()
-    channels = load_channels()
+    persist = channels is None
+    if persist:
+        channels = load_channels()
     virtu_log(f"VirtuaTV: Loaded {len(channels)} channels for file generation", virtu_logDEBUG)
     if not channels:
         virtu_log(f"VirtuaTV: No channels to process for file generation", virtu_logERROR)
@@ -623,381 +921,61 @@ def generate_channel_files(channel_number):
             if playlist.get('type') == 'base' and 'interleave' in playlist:
                 virtu_log(f"VirtuaTV: Warning: Interleave settings ignored for base playlist {playlist['path']} in channel {channel_name}", virtu_logWARNING)
                 playlist.pop('interleave', None)
-        virtu_log(f"VirtuaTV: Saving full channels list before file generation: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
-        save_channels(channels)
-        virtu_log(f"VirtuaTV: Saved channels.json with initial last_index and random_order for channel {channel_name}", virtu_logINFO)
         safe_channel_name = ''.join(c for c in channel_name if c.isalnum() or c in (' ', '_', '-')).replace(' ', '_')
         m3u_filename = os.path.join(storage_path, f'VirtuaTV_Channel_{channel_number}_{safe_channel_name}.m3u')
         virtu_log(f"VirtuaTV: Generating M3U file at {m3u_filename}", virtu_logINFO)
-        all_playlists = []
-        for playlist_idx, playlist in enumerate(playlists):
-            playlist_type = playlist.get('playlist_type')
-            source = playlist.get('source', 'playlist')
-            virtu_log(f"VirtuaTV: Processing Playlist {playlist_idx} as {playlist_type} (source: {source})", virtu_logDEBUG)
-            items, rule_order, is_random = get_playlist_items_with_durations(playlist['path'], playlist_type, source=source)
-            if not items:
-                virtu_log(f"VirtuaTV: No items found for Playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
-                dialog.notification("VirtuaTV", f"No items found for playlist {playlist['path']} in channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
-                time.sleep(0.1)
-                continue
-            is_one_match = False
-            if source == 'playlist':
-                try:
-                    with xbmcvfs.File(playlist['path'], 'r') as f:
-                        xml_content = f.read()
-                    tree = ET.fromstring(xml_content)
-                    match_elem = tree.find('match')
-                    is_one_match = match_elem.text == 'one' if match_elem is not None else False
-                except Exception as e:
-                    virtu_log(f"VirtuaTV: Error parsing playlist for match type: {str(e)}", virtu_logERROR)
-            item_groups = {}
-            conn, cursor, db_type, _ = get_database_connection()
-            if conn is None or cursor is None:
-                continue
-            try:
-                for item in items:
-                    if not isinstance(item, dict) or 'file' not in item:
-                        virtu_log(f"VirtuaTV: Invalid item in Playlist {playlist_idx}: {item}", virtu_logWARNING)
-                        continue
-                    try:
-                        filename = os.path.basename(item['file'])
-                        path = os.path.dirname(item['file']) + '/'
-                        item_name = item.get('showtitle', item.get('title', os.path.basename(item['file'])))
-                        item_description = item.get('plot', '')
-                        item_categories = item.get('genre', [])
-                        item_date = item.get('year', '')
-                        item_icon = item.get('thumbnail', '')
-                        if source == 'playlist':
-                            if db_type == 'mysql':
-                                query = (
-                                    """
-                                    SELECT tvshow.c00, tvshow.c01, tvshow.c08, tvshow.c05
-                                    FROM episode
-                                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                                    JOIN files ON episode.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = %s AND path.strPath = %s
-                                    """ if playlist_type == 'episodes' else """
-                                    SELECT movie.c00, movie.c01, movie.c06, movie.c07
-                                    FROM movie
-                                    JOIN files ON movie.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = %s AND path.strPath = %s
-                                    """
-                                )
-                                params = (filename, path)
-                            else:
-                                query = (
-                                    """
-                                    SELECT tvshow.c00, tvshow.c01, tvshow.c08, tvshow.c05
-                                    FROM episode
-                                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                                    JOIN files ON episode.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = ? AND path.strPath = ?
-                                    """ if playlist_type == 'episodes' else """
-                                    SELECT movie.c00, movie.c01, movie.c06, movie.c07
-                                    FROM movie
-                                    JOIN files ON movie.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = ? AND path.strPath = ?
-                                    """
-                                )
-                                params = (filename, path)
-                            cursor.execute(query, params)
-                            results = cursor.fetchall()
-                            if results:
-                                item_name, item_description, item_categories, item_date = results[0]
-                                item_categories = item_categories.split(',') if item_categories else ['Unknown']
-                            else:
-                                virtu_log(f"VirtuaTV: No {'TV show' if playlist_type == 'episodes' else 'movie'} information found for {filename} in Playlist {playlist_idx}. Using title or filename: {item_name}", virtu_logWARNING)
-                        else:
-                            item_name = os.path.basename(playlist['path']) if playlist_type == 'episodes' else item['title']
-                            item_categories = ['Unknown'] if not item_categories else item_categories
-                        if item_name not in item_groups:
-                            item_groups[item_name] = {'items': [], 'description': item_description, 'categories': item_categories, 'date': item_date, 'icon': item_icon}
-                        if item_name not in playlist['last_index']:
-                            playlist['last_index'][item_name] = -1
-                        item_groups[item_name]['items'].append(item)
-                        virtu_log(f"VirtuaTV: Added item {filename} to Playlist {playlist_idx} item {item_name}", virtu_logDEBUG)
-                    except Exception as e:
-                        virtu_log(f"VirtuaTV: Error processing item {item} in Playlist {playlist_idx}: {str(e)}", virtu_logERROR)
-                        continue
-                cursor.close()
-                conn.close()
-            except Exception as e:
-                virtu_log(f"VirtuaTV: Error grouping Playlist {playlist_idx} items: {str(e)}", virtu_logERROR)
-                dialog.notification("VirtuaTV", f"Failed to group items for playlist {playlist['path']}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
-                time.sleep(0.1)
-                continue
-            if not item_groups:
-                virtu_log(f"VirtuaTV: No valid {'episodes' if playlist_type == 'episodes' else 'movies'} found for Playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
-                dialog.notification("VirtuaTV", f"No valid items found for playlist {playlist['path']} in channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
-                time.sleep(0.1)
-                continue
-            sorted_item_groups = {}
-            ordered_shows = rule_order if rule_order else list(item_groups.keys())
-            if source == 'playlist' and is_random and playlist_type == 'episodes' and is_one_match:
-                random.shuffle(ordered_shows)
-                virtu_log(f"VirtuaTV: Randomized show order for Playlist {playlist_idx} (<match>one</match>): {ordered_shows}", virtu_logDEBUG)
-            elif playlist.get('fixed_show_order'):
-                ordered_shows = [show for show in playlist['fixed_show_order'] if show in item_groups]
-                virtu_log(f"VirtuaTV: Using fixed show order for Playlist {playlist_idx}: {ordered_shows}", virtu_logINFO)
-            elif playlist.get('shuffle_shows', False):
-                random.shuffle(ordered_shows)
-                virtu_log(f"VirtuaTV: Shuffled show order for Playlist {playlist_idx}: {ordered_shows}", virtu_logDEBUG)
-            for item_name in ordered_shows:
-                if item_name in item_groups:
-                    sorted_item_groups[item_name] = item_groups[item_name]
-                    if playlist_type == 'episodes' and source == 'playlist' and is_random:
-                        if item_name not in playlist['random_order'] or not playlist['random_order'][item_name]:
-                            playlist['random_order'][item_name] = list(range(len(item_groups[item_name]['items'])))
-                            random.shuffle(playlist['random_order'][item_name])
-                            virtu_log(f"VirtuaTV: Generated random order for {item_name} in Playlist {playlist_idx}: {playlist['random_order'][item_name]}", virtu_logINFO)
-                        sorted_item_groups[item_name]['items'] = [
-                            sorted_item_groups[item_name]['items'][i] for i in playlist['random_order'][item_name]
-                        ]
-                    elif playlist_type == 'episodes' and source == 'playlist':
-                        sorted_item_groups[item_name]['items'].sort(key=lambda x: (int(x.get('season', 1)), int(x.get('episode', 1))))
-                    virtu_log(f"VirtuaTV: Playlist {playlist_idx} item {item_name} has {len(sorted_item_groups[item_name]['items'])} {'episodes' if playlist_type == 'episodes' else 'movies'}", virtu_logINFO)
-            if playlist['random_order']:
-                virtu_log(f"VirtuaTV: Saving full channels list after random_order update: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
-                save_channels(channels)
-                virtu_log(f"VirtuaTV: Saved channels.json with updated random_order for Playlist {playlist_idx} in channel {channel_name}", virtu_logINFO)
-            all_playlists.append({
-                'items': sorted_item_groups,
-                'interleave': playlist.get('interleave', {'low': 1, 'high': 1, 'count': 1}),
-                'last_index': playlist['last_index'],
-                'random_order': playlist['random_order'],
-                'type': playlist_type,
-                'path': playlist['path'],
-                'is_random': is_random,
-                'shuffle_shows': playlist.get('shuffle_shows', False)
-            })
+        all_playlists = build_channel_playlists(channel, dialog)
         if not all_playlists:
             virtu_log(f"VirtuaTV: No valid playlists for channel {channel_name}", virtu_logWARNING)
             dialog.notification("VirtuaTV", f"No valid playlists found for channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
             time.sleep(0.1)
             return False
-        indices = {
-            playlist_idx: {item_name: playlist['last_index'].get(item_name, -1) + 1 for item_name in playlist['items']}
-            for playlist_idx, playlist in enumerate(all_playlists)
-        }
-        item_counts = {
-            playlist_idx: {item_name: len(item_data['items']) for item_name, item_data in playlist['items'].items()}
-            for playlist_idx, playlist in enumerate(all_playlists)
-        }
-        interleaved_track = []
-        total_items = 0
-        total_duration = 0
-        base_playlist_idx = 0
-        base_items = list(all_playlists[base_playlist_idx]['items'].keys()) if all_playlists else []
-        cycle_length = len(base_items) if base_items else 1
-        add_item_counters = {add_playlist_idx: 0 for add_playlist_idx in range(1, len(all_playlists))}
+        engine = ScheduleEngine(all_playlists, limit_type, max_duration if limit_type == 'time' else max_items)
         try:
-            cycle_count = 0
-            while (limit_type == 'time' and total_duration < max_duration) or (limit_type == 'items' and total_items < max_items):
-                cycle_count += 1
-                base_items = list(all_playlists[base_playlist_idx]['items'].keys())
-                if all_playlists[base_playlist_idx].get('shuffle_shows', False):
-                    random.shuffle(base_items)
-                    virtu_log(f"VirtuaTV: Shuffled base items for cycle: {base_items}", virtu_logDEBUG)
-                base_cycle = []
-                for item_name in base_items:
-                    if (limit_type == 'time' and total_duration >= max_duration) or (limit_type == 'items' and total_items >= max_items):
-                        break
-                    item_data = all_playlists[base_playlist_idx]['items'][item_name]
-                    items = item_data['items']
-                    num_items = item_counts[base_playlist_idx][item_name]
-                    item_idx = indices[base_playlist_idx][item_name] % num_items
-                    item = items[item_idx]
-                    base_cycle.append((base_playlist_idx, item_name, item, item_idx))
-                    episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[base_playlist_idx]['type'] == 'episodes' else 1
-                    indices[base_playlist_idx][item_name] = (indices[base_playlist_idx][item_name] + episode_count) % num_items
-                    virtu_log(f"VirtuaTV: Prepared base item {item_name} index {item_idx + 1}/{num_items} for cycle", virtu_logDEBUG)
-                if len(all_playlists) == 1:
-                    for _, item_name, item, item_idx in base_cycle:
-                        interleaved_track.append((item_name, item))
-                        episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[base_playlist_idx]['type'] == 'episodes' else 1
-                        all_playlists[base_playlist_idx]['last_index'][item_name] = (item_idx + episode_count - 1) % item_counts[base_playlist_idx][item_name]
-                        virtu_log(
-                            f"VirtuaTV: Added base item {item_name} index {item_idx + 1}/{item_counts[base_playlist_idx][item_name]}: {item['title']} (episodes: {episode_count}) (single playlist), updated last_index to {(item_idx + episode_count - 1) % item_counts[base_playlist_idx][item_name]}",
-                            virtu_logDEBUG
-                        )
-                        total_items += 1
-                        total_duration += item['duration']
-                    continue
-                new_cycle_length = cycle_length
-                for add_playlist_idx, add_playlist in enumerate(all_playlists[1:], 1):
-                    count = max(1, add_playlist['interleave'].get('count', 1))
-                    new_cycle_length += count
-                    virtu_log(f"VirtuaTV: New cycle length for channel {channel_name}: {new_cycle_length} (base: {cycle_length}, additional: {new_cycle_length - cycle_length})", virtu_logDEBUG)
-                insert_positions = {}
-                fixed_playlists = [(idx, p) for idx, p in enumerate(all_playlists[1:], 1) if p['interleave'].get('low') == p['interleave'].get('high')]
-                for add_playlist_idx, add_playlist in fixed_playlists:
-                    low = add_playlist['interleave'].get('low', 1)
-                    count = max(1, add_playlist['interleave'].get('count', 1))
-                    if low < 1:
-                        virtu_log(f"VirtuaTV: Invalid low value {low} for Playlist {add_playlist_idx} ({add_playlist['path']}) in channel {channel_name}. Must be >= 1. Defaulting to 1.", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Invalid low value {low} for playlist {add_playlist['path']}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        low = 1
-                    if low > new_cycle_length:
-                        virtu_log(f"VirtuaTV: Invalid low value {low} for Playlist {add_playlist_idx} ({add_playlist['path']}) in channel {channel_name}. Must be <= {new_cycle_length}. Defaulting to {new_cycle_length}.", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Invalid low value {low} for playlist {add_playlist['path']}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        low = new_cycle_length
-                    pos = low
-                    insert_positions[add_playlist_idx] = pos
-                    virtu_log(f"VirtuaTV: Assigned fixed position {pos} with count {count} to Playlist {add_playlist_idx} ({add_playlist['path']})", virtu_logDEBUG)
-                random_playlists = [(idx, p) for idx, p in enumerate(all_playlists[1:], 1) if p['interleave'].get('low') != p['interleave'].get('high')]
-                for add_playlist_idx, add_playlist in random_playlists:
-                    low = add_playlist['interleave'].get('low', 1)
-                    high = add_playlist['interleave'].get('high', 1)
-                    count = max(1, add_playlist['interleave'].get('count', 1))
-                    if low < 1:
-                        virtu_log(f"VirtuaTV: Invalid low value {low} for Playlist {add_playlist_idx} ({add_playlist['path']}) in channel {channel_name}. Must be >= 1. Defaulting to 1.", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Invalid low value {low} for playlist {add_playlist['path']}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        low = 1
-                    if high < low:
-                        virtu_log(f"VirtuaTV: Invalid range: low ({low}) > high ({high}) for Playlist {add_playlist_idx} ({add_playlist['path']}) in channel {channel_name}. Swapping values.", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Invalid interleave range for playlist {add_playlist['path']}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        low, high = high, low
-                    if high > new_cycle_length:
-                        virtu_log(f"VirtuaTV: Invalid high value {high} for Playlist {add_playlist_idx} ({add_playlist['path']}) in channel {channel_name}. Must be <= {new_cycle_length}. Defaulting to {new_cycle_length}.", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Invalid high value {high} for playlist {add_playlist['path']}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        high = new_cycle_length
-                    valid_positions = [p for p in range(1, new_cycle_length + 1) if low <= p <= min(high, new_cycle_length - count + 1)]
-                    pos = random.choice(valid_positions) if valid_positions else 1
-                    insert_positions[add_playlist_idx] = pos
-                    virtu_log(f"VirtuaTV: Assigned random position {pos} with count {count} to Playlist {add_playlist_idx} ({add_playlist['path']})", virtu_logDEBUG)
-                shuffled_available = {}
-                for add_playlist_idx in range(1, len(all_playlists)):
-                    add_playlist = all_playlists[add_playlist_idx]
-                    avail = list(add_playlist['items'].keys())
-                    if add_playlist.get('shuffle_shows', False):
-                        random.shuffle(avail)
-                        virtu_log(f"VirtuaTV: Shuffled additional items for cycle in Playlist {add_playlist_idx}: {avail}", virtu_logDEBUG)
-                    shuffled_available[add_playlist_idx] = avail
-                current_cycle = []
-                current_position = 0
-                base_idx = 0
-                while current_position < new_cycle_length and ((limit_type == 'time' and total_duration < max_duration) or (limit_type == 'items' and total_items < max_items)):
-                    current_position += 1
-                    inserted = False
-                    for add_playlist_idx in sorted(insert_positions.keys()):
-                        add_playlist = all_playlists[add_playlist_idx]
-                        count = max(1, add_playlist['interleave'].get('count', 1))
-                        if insert_positions[add_playlist_idx] <= current_position < insert_positions[add_playlist_idx] + count:
-                            available_items = shuffled_available[add_playlist_idx]
-                            if available_items:
-                                item_idx = add_item_counters[add_playlist_idx] % len(available_items)
-                                item_name = available_items[item_idx]
-                                if item_name in item_counts[add_playlist_idx]:
-                                    item_data = add_playlist['items'][item_name]
-                                    items = item_data['items']
-                                    num_items = item_counts[add_playlist_idx][item_name]
-                                    item_idx_episode = indices[add_playlist_idx][item_name] % num_items
-                                    item = items[item_idx_episode]
-                                    current_cycle.append((item_name, item))
-                                    episode_count = get_episode_count(os.path.basename(item['file'])) if add_playlist['type'] == 'episodes' else 1
-                                    add_playlist['last_index'][item_name] = (item_idx_episode + episode_count - 1) % num_items
-                                    virtu_log(
-                                        f"VirtuaTV: Adding Playlist {add_playlist_idx} {item_name} item {item_idx_episode + 1}/{num_items}: {item['title']} (episodes: {episode_count}) at position {current_position}, updated last_index to {(item_idx_episode + episode_count - 1) % num_items}",
-                                        virtu_logDEBUG
-                                    )
-                                    total_items += 1
-                                    total_duration += item['duration']
-                                    indices[add_playlist_idx][item_name] = (indices[add_playlist_idx][item_name] + episode_count) % num_items
-                                    inserted = True
-                                    add_item_counters[add_playlist_idx] += 1
-                                else:
-                                    virtu_log(f"VirtuaTV: Skipping additional item {item_name} due to missing item_count in Playlist {add_playlist_idx}", virtu_logWARNING)
-                            else:
-                                virtu_log(f"VirtuaTV: No available items for Playlist {add_playlist_idx} ({add_playlist['path']})", virtu_logWARNING)
-                    if not inserted and base_idx < len(base_cycle) and ((limit_type == 'time' and total_duration < max_duration) or (limit_type == 'items' and total_items < max_items)):
-                        playlist_idx, item_name, item, item_idx = base_cycle[base_idx]
-                        if item_name in item_counts[playlist_idx]:
-                            current_cycle.append((item_name, item))
-                            episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[playlist_idx]['type'] == 'episodes' else 1
-                            all_playlists[playlist_idx]['last_index'][item_name] = (item_idx + episode_count - 1) % item_counts[playlist_idx][item_name]
-                            virtu_log(
-                                f"VirtuaTV: Adding Playlist {playlist_idx} {item_name} item {item_idx + 1}/{item_counts[playlist_idx][item_name]}: {item['title']} (episodes: {episode_count}) at position {current_position}, updated last_index to {(item_idx + episode_count - 1) % item_counts[playlist_idx][item_name]}",
-                                virtu_logDEBUG
-                            )
-                            total_items += 1
-                            total_duration += item['duration']
-                        else:
-                            virtu_log(f"VirtuaTV: Skipping base item {item_name} due to missing item_count in Playlist {playlist_idx}", virtu_logWARNING)
-                        base_idx += 1
-                interleaved_track.extend(current_cycle)
-                virtu_log(f"VirtuaTV: Completed cycle {cycle_count} with {len(current_cycle)} items, total_items={total_items}, total_duration={total_duration}", virtu_logDEBUG)
+            dialog.notification("VirtuaTV", f"Writing M3U file for channel {channel_name}...", xbmcgui.NOTIFICATION_INFO, 1500)
+            time.sleep(0.1)
+            # The sidecar is streamed alongside the M3U and both are replaced together
+            with schedule_index_writer(m3u_filename, None, len('#EXTM3U\n')) as index_writer, atomic_write(m3u_filename) as f:
+                f.write('#EXTM3U\n')
+                written, _ = write_m3u_entries(f, engine.entries(), all_playlists[0], channel_name, index_writer)
+                gen_time = datetime.datetime.now(datetime.timezone.utc)
+                index_writer.anchor = gen_time.timestamp()
+            virtu_log(f"VirtuaTV: Built {engine.total_items} entries in {engine.cycle_count} cycles for channel {channel_name}, total_duration={engine.total_duration}", virtu_logDEBUG)
+            virtu_log(f"VirtuaTV: Added {written} entries for channel {channel_name} in {m3u_filename}", virtu_logINFO)
+            for warning in engine.warnings:
+                virtu_log(f"VirtuaTV: {warning} (channel {channel_name})", virtu_logWARNING)
+                dialog.notification("VirtuaTV", warning, xbmcgui.NOTIFICATION_WARNING, 3000)
+                time.sleep(0.1)
         except Exception as e:
-            virtu_log(f"VirtuaTV: Error building schedule for channel {channel_name}: {str(e)}", virtu_logERROR)
-            dialog.notification("VirtuaTV", f"Error building schedule for channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
+            virtu_log(f"VirtuaTV: Error writing M3U file for channel {channel_name}: {str(e)}", virtu_logERROR)
+            dialog.notification("VirtuaTV", f"Error writing M3U file for channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
             time.sleep(0.1)
             return False
         try:
             for playlist_idx, playlist in enumerate(all_playlists):
                 channel['playlists'][playlist_idx]['last_index'] = {
                     item_name: all_playlists[playlist_idx]['last_index'][item_name]
-                    for item_name in playlist['items'] if item_name in item_counts[playlist_idx]
+                    for item_name in playlist['items'] if item_name in all_playlists[playlist_idx]['last_index']
                 }
                 channel['playlists'][playlist_idx]['random_order'] = {
                     item_name: all_playlists[playlist_idx]['random_order'][item_name]
                     for item_name in playlist['items'] if item_name in all_playlists[playlist_idx]['random_order']
-                    and isinstance(all_playlists[playlist_idx]['random_order'][item_name], list)
+                    and isinstance(all_playlists[playlist_idx]['random_order'][item_name], dict)
                 }
                 virtu_log(f"VirtuaTV: Updated last_index and random_order for Playlist {playlist_idx}: {channel['playlists'][playlist_idx]['last_index']}, random_order: {channel['playlists'][playlist_idx]['random_order']}", virtu_logDEBUG)
-            virtu_log(f"VirtuaTV: Saving full channels list after updating last_index and random_order: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
-            save_channels(channels)
-            virtu_log(f"VirtuaTV: Saved channels.json with updated last_index and random_order for channel {channel_name}", virtu_logINFO)
-        except Exception as e:
-            virtu_log(f"VirtuaTV: Error saving channels.json for channel {channel_name}: {str(e)}", virtu_logERROR)
-            dialog.notification("VirtuaTV", f"Error saving channels for channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
-            time.sleep(0.1)
-            return False
-        try:
-            dialog.notification("VirtuaTV", f"Writing M3U file for channel {channel_name}...", xbmcgui.NOTIFICATION_INFO, 1500)
-            time.sleep(0.1)
-            with xbmcvfs.File(m3u_filename, 'w') as f:
-                f.write('#EXTM3U\n')
-                for item_name, item in interleaved_track:
-                    if not isinstance(item, dict) or 'title' not in item or 'file' not in item:
-                        virtu_log(f"VirtuaTV: Invalid item in interleaved track for channel {channel_name}: {item}", virtu_logWARNING)
-                        continue
-                    file_path = item['file']
-                    if not xbmcvfs.exists(file_path):
-                        virtu_log(f"VirtuaTV: Inaccessible file path: {file_path}", virtu_logWARNING)
-                        dialog.notification("VirtuaTV", f"Inaccessible file path: {file_path}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                        time.sleep(0.1)
-                        continue
-                    duration = item.get('duration', 0)
-                    if duration <= 0:
-                        virtu_log(f"VirtuaTV: Skipping item {item['title']} with invalid duration {duration}", virtu_logWARNING)
-                        continue
-                    title = item['title']
-                    description = all_playlists[0]['items'].get(item_name, {}).get('description', '')
-                    season_episode = f"S{item.get('season', 0):02d}E{item.get('episode', 0):02d}" if all_playlists[0]['type'] == 'episodes' and 'season' in item and 'episode' in item else ''
-                    entry_title = f"{item_name}//{title} ({season_episode})//{description}" if season_episode else f"{item_name}//{title}//{description}"
-                    f.write(f'#EXTINF:{int(duration)},{entry_title}\n')
-                    f.write(f'{file_path}\n')
-            virtu_log(f"VirtuaTV: Added {len(interleaved_track)} entries for channel {channel_name} in {m3u_filename}", virtu_logINFO)
         except Exception as e:
-            virtu_log(f"VirtuaTV: Error writing M3U file for channel {channel_name}: {str(e)}", virtu_logERROR)
-            dialog.notification("VirtuaTV", f"Error writing M3U file for channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
+            virtu_log(f"VirtuaTV: Error updating last_index and random_order for channel {channel_name}: {str(e)}", virtu_logERROR)
+            dialog.notification("VirtuaTV", f"Error updating channel state for channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000)
             time.sleep(0.1)
             return False
         try:
             if is_new_channel:
                 channel['is_new'] = False
-            channel['last_gen_time'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            channel['total_gen_duration'] = total_duration
-            virtu_log(f"VirtuaTV: Saving full channels list after updating is_new flag and generation info: {json.dumps(channels, indent=2)}", virtu_logDEBUG)
-            save_channels(channels)
+            channel['last_gen_time'] = gen_time.isoformat()
+            channel['total_gen_duration'] = index_writer.total_duration
+            # Everything the build changed in channels.json goes out in this one save
+            if persist:
+                save_channels(channels)
             dialog.notification("VirtuaTV", f"Successfully generated files for channel {channel_name}", xbmcgui.NOTIFICATION_INFO, 1500)
             virtu_log(f"VirtuaTV: Generated files for channel {channel_number}", virtu_logINFO)
             time.sleep(0.1)
@@ -1013,16 +991,14 @@ def generate_channel_files(channel_number):
         time.sleep(0.1)
         return False
 
-def update_channel_files(channel_number):
-    """Update M3U by removing expired items and appending new ones."""
-    def get_episode_count(filename):
-        match = re.search(r'S(\d{2})E(\d{2})-?E?(\d{2})?', filename, re.IGNORECASE)
-        if match and match.group(3):
-            start_ep = int(match.group(2))
-            end_ep = int(match.group(3))
-            return end_ep - start_ep + 1
-        return 1
-    channels = load_channels()
+def update_channel_files(channel_number, channels=None):
+    """Update M3U by removing expired items and appending new ones.
+
+    When channels is passed the channel is updated in that list and the caller saves it.
+    """
+    persist = channels is None
+    if persist:
+        channels = load_channels()
     virtu_log(f"Loaded {len(channels)} channels for file update", virtu_logDEBUG)
     if not channels:
         virtu_log("No channels to process for file update", virtu_logERROR)
@@ -1043,14 +1019,14 @@ def update_channel_files(channel_number):
         max_items = int(ADDON.getSetting('max_playlist_items') or 1000)
         max_duration = int(ADDON.getSetting('max_playlist_duration') or 24) * 3600
         virtu_log(f"Using storage_path={storage_path}, max_playlist_items={max_items}, max_playlist_duration={max_duration}", virtu_logINFO)
-        progress_dialog = xbmcgui.DialogProgress()
+        # Pooled builds run side by side, so they report through background dialogs instead of a modal one
+        progress_dialog = xbmcgui.DialogProgress() if persist else xbmcgui.DialogProgressBG()
         progress_dialog.create("VirtuaTV", f"Updating files for channel {channel_number}...")
         try:
             channel_name = channel['name']
             channel_id = channel.get('id', f"{channel_name}@VirtuaTV")
             if 'id' not in channel:
                 channel['id'] = channel_id
-                save_channels(channels)
                 virtu_log(f"VirtuaTV: Added missing channel_id {channel_id} to channel {channel_name}", virtu_logINFO)
             safe_channel_name = ''.join(c for c in channel_name if c.isalnum() or c in (' ', '_', '-')).replace(' ', '_')
             m3u_filename = os.path.join(storage_path, f'VirtuaTV_Channel_{channel_number}_{safe_channel_name}.m3u')
@@ -1058,68 +1034,59 @@ def update_channel_files(channel_number):
             if channel.get('is_new', False):
                 virtu_log(f"Channel {channel_name} flagged for full regeneration", virtu_logINFO)
                 progress_dialog.close()
-                return generate_channel_files(channel_number)
+                return generate_channel_files(channel_number, None if persist else channels)
             if not xbmcvfs.exists(m3u_filename):
                 virtu_log(f"Files do not exist, falling back to full generation for channel {channel_number}", virtu_logINFO)
                 progress_dialog.close()
-                return generate_channel_files(channel_number)
-            with xbmcvfs.File(m3u_filename, 'r') as f:
-                m3u_content = f.read()
-            if not m3u_content.strip():
-                virtu_log(f"Empty M3U, falling back to full generation", virtu_logINFO)
-                progress_dialog.close()
-                return generate_channel_files(channel_number)
-            m3u_lines = m3u_content.splitlines()
-            durations = []
-            for line in m3u_lines:
-                if line.startswith('#EXTINF:'):
-                    match = re.search(r'#EXTINF:(\d+)', line)
-                    if match:
-                        durations.append(int(match.group(1)))
-            if not durations:
-                virtu_log(f"No durations found in M3U, falling back to full generation", virtu_logERROR)
-                progress_dialog.close()
-                return generate_channel_files(channel_number)
-            last_gen_time = datetime.datetime.fromisoformat(channel.get('last_gen_time', datetime.datetime.now(datetime.timezone.utc).isoformat()))
+                return generate_channel_files(channel_number, None if persist else channels)
             now = datetime.datetime.now(datetime.timezone.utc)
-            time_passed = (now - last_gen_time).total_seconds()
-            cum = 0
-            removed_k = 0
-            for removed_k in range(len(durations)):
-                cum += max(durations[removed_k], 0)
-                if cum > time_passed:
-                    break
-            else:
-                removed_k = len(durations)
-            if removed_k < len(durations):
-                removed_duration = cum - max(durations[removed_k], 0)
+            last_gen_time = datetime.datetime.fromisoformat(channel.get('last_gen_time', now.isoformat()))
+            schedule_index = load_schedule_index(m3u_filename)
+            if schedule_index is not None:
+                # The sidecar is rewritten along with the M3U, compaction included, and it is what the player
+                # and the EPG time the schedule by; channels.json only mirrors its anchor
+                channel['last_gen_time'] = datetime.datetime.fromtimestamp(schedule_index.anchor, datetime.timezone.utc).isoformat()
             else:
-                removed_duration = cum
-            remaining_durations = durations[removed_k:]
-            remaining_duration = sum(max(d, 0) for d in remaining_durations)
+                schedule_index = rebuild_schedule_index(m3u_filename, last_gen_time.timestamp())
+                if schedule_index is None or not len(schedule_index):
+                    virtu_log(f"No entries found in M3U, falling back to full generation", virtu_logERROR)
+                    progress_dialog.close()
+                    return generate_channel_files(channel_number, None if persist else channels)
+            # Safe Append Mode: played entries stay at the head of the file, so what players have already
+            # indexed never moves; only the schedule still to come counts towards the refill
+            played_k = schedule_index.elapsed_count(now.timestamp())
+            remaining_count = len(schedule_index) - played_k
+            remaining_duration = schedule_index.total_duration - schedule_index.offsets[played_k]
+            rebuild_size = int(ADDON.getSetting('rebuild_size_mb') or 0) * 1048576
+            if rebuild_size > 0 and played_k > 0:
+                m3u_size = xbmcvfs.Stat(m3u_filename).st_size()
+                if m3u_size > rebuild_size:
+                    # The index knows where the first unplayed entry starts, so the played size is exact. Waiting
+                    # for a share of the file to air keeps a long unplayed tail from being rewritten every refill
+                    played_size = schedule_index.positions[played_k] - schedule_index.positions[0]
+                    if played_size < rebuild_size and played_size < m3u_size * COMPACT_MIN_PLAYED_SHARE:
+                        virtu_log(f"M3U for channel {channel_name} is {m3u_size} bytes but only {played_size} have aired; not compacting yet", virtu_logDEBUG)
+                    else:
+                        compacted = compact_m3u(m3u_filename, schedule_index, played_k)
+                        if compacted is not None:
+                            schedule_index = compacted
+                            channel['last_gen_time'] = datetime.datetime.fromtimestamp(compacted.anchor, datetime.timezone.utc).isoformat()
+                            channel['total_gen_duration'] = compacted.total_duration
+                            virtu_log(f"Compacted M3U for channel {channel_name}: dropped {played_k} played items from {m3u_size} bytes", virtu_logINFO)
             limit_type = channel.get('limit_type', 'time')
             if limit_type == 'time':
                 to_add_duration = max_duration - remaining_duration
                 to_add_items = 0
             else:
-                to_add_items = max_items - len(remaining_durations)
+                to_add_items = max_items - remaining_count
                 to_add_duration = 0
             if (limit_type == 'time' and to_add_duration <= 0) or (limit_type == 'items' and to_add_items <= 0):
                 virtu_log(f"No need to add items for channel {channel_name}", virtu_logINFO)
-                temp_m3u = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_m3u_{os.getpid()}.m3u")
-                with xbmcvfs.File(temp_m3u, 'w') as f:
-                    f.write('\n'.join(m3u_lines[:1] + m3u_lines[removed_k*2+1:]) + '\n')
-                if not xbmcvfs.copy(temp_m3u, m3u_filename):
-                    virtu_log(f"Failed to update M3U file for channel {channel_name}", virtu_logERROR)
-                    xbmcvfs.delete(temp_m3u)
-                    progress_dialog.close()
-                    return False
-                xbmcvfs.delete(temp_m3u)
-                channel['last_gen_time'] = now.isoformat()
-                channel['total_gen_duration'] = remaining_duration
+                channel['total_gen_duration'] = schedule_index.total_duration
                 channel['is_new'] = False
-                save_channels(channels)
-                virtu_log(f"Updated files for channel {channel_number}: removed {removed_k} items, no new items added, total_duration={channel['total_gen_duration']}", virtu_logINFO)
+                if persist:
+                    save_channels(channels)
+                virtu_log(f"Left files for channel {channel_number} untouched: {played_k} items played, total_duration={channel.get('total_gen_duration')}", virtu_logINFO)
                 progress_dialog.close()
                 return True
             virtu_log(f"Adding {'duration: ' + str(to_add_duration) if limit_type == 'time' else 'items: ' + str(to_add_items)} for channel {channel_name}", virtu_logINFO)
@@ -1132,359 +1099,65 @@ def update_channel_files(channel_number):
                 if playlist.get('type') == 'base' and 'interleave' in playlist:
                     virtu_log(f"Warning: Interleave settings ignored for base playlist {playlist['path']} in channel {channel_name}", virtu_logWARNING)
                     playlist.pop('interleave', None)
-            save_channels(channels)
-            all_playlists = []
-            for playlist_idx, playlist in enumerate(playlists):
-                playlist_type = playlist.get('playlist_type')
-                source = playlist.get('source', 'playlist')
-                progress_dialog.update(int(playlist_idx / len(playlists) * 100), f"Loading Playlist {playlist_idx}: {os.path.basename(playlist['path'])}")
-                virtu_log(f"Processing playlist {playlist['path']} (type: {playlist_type}, source: {source}) for channel {channel_name}", virtu_logDEBUG)
-                items, rule_order, is_random = get_playlist_items_with_durations(playlist['path'], playlist_type, source=source)
-                if not items:
-                    virtu_log(f"No items found for playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
-                    continue
-                virtu_log(f"Retrieved {len(items)} items for playlist {playlist['path']}, rule_order: {rule_order}, is_random: {is_random}", virtu_logDEBUG)
-                item_groups = {}
-                conn, cursor, db_type, _ = get_database_connection()
-                if conn is None or cursor is None:
-                    virtu_log(f"Failed to connect to database for playlist {playlist['path']}", virtu_logERROR)
-                    continue
-                try:
-                    for item in items:
-                        if not isinstance(item, dict) or 'file' not in item:
-                            virtu_log(f"Invalid item in playlist {playlist['path']}: {item}", virtu_logWARNING)
-                            continue
-                        filename = os.path.basename(item['file'])
-                        path = os.path.dirname(item['file']) + '/'
-                        item_name = item.get('showtitle', item.get('title', os.path.basename(item['file'])))
-                        item_description = item.get('plot', '')
-                        item_categories = item.get('genre', [])
-                        item_date = item.get('year', '')
-                        item_icon = item.get('thumbnail', '')
-                        if source == 'playlist':
-                            if db_type == 'mysql':
-                                query = (
-                                    """
-                                    SELECT tvshow.c00, tvshow.c01, tvshow.c08, tvshow.c05
-                                    FROM episode
-                                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                                    JOIN files ON episode.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = %s AND path.strPath = %s
-                                    """ if playlist_type == 'episodes' else """
-                                    SELECT movie.c00, movie.c01, movie.c06, movie.c07
-                                    FROM movie
-                                    JOIN files ON movie.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = %s AND path.strPath = %s
-                                    """
-                                )
-                                params = (filename, path)
-                            else:
-                                query = (
-                                    """
-                                    SELECT tvshow.c00, tvshow.c01, tvshow.c08, tvshow.c05
-                                    FROM episode
-                                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                                    JOIN files ON episode.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = ? AND path.strPath = ?
-                                    """ if playlist_type == 'episodes' else """
-                                    SELECT movie.c00, movie.c01, movie.c06, movie.c07
-                                    FROM movie
-                                    JOIN files ON movie.idFile = files.idFile
-                                    JOIN path ON files.idPath = path.idPath
-                                    WHERE files.strFilename = ? AND path.strPath = ?
-                                    """
-                                )
-                                params = (filename, path)
-                            cursor.execute(query, params)
-                            results = cursor.fetchall()
-                            if results:
-                                item_name, item_description, item_categories, item_date = results[0]
-                                item_categories = item_categories.split(',') if item_categories else ['Unknown']
-                            else:
-                                virtu_log(f"No {'TV show' if playlist_type == 'episodes' else 'movie'} information found for {filename} in playlist {playlist['path']}. Using title or filename: {item_name}", virtu_logWARNING)
-                        else:
-                            item_name = os.path.basename(playlist['path']) if playlist_type == 'episodes' else item['title']
-                            item_categories = ['Unknown'] if not item_categories else item_categories
-                        if item_name not in item_groups:
-                            item_groups[item_name] = {'items': [], 'description': item_description, 'categories': item_categories, 'date': item_date, 'icon': item_icon}
-                        if item_name not in playlist['last_index']:
-                            playlist['last_index'][item_name] = -1
-                        item_groups[item_name]['items'].append(item)
-                        virtu_log(f"Added item {filename} to group {item_name} in playlist {playlist['path']}", virtu_logDEBUG)
-                    cursor.close()
-                    conn.close()
-                except Exception as e:
-                    virtu_log(f"Error grouping items for playlist {playlist['path']}: {str(e)}", virtu_logERROR)
-                    if conn:
-                        cursor.close()
-                        conn.close()
-                    continue
-                if not item_groups:
-                    virtu_log(f"No valid {'episodes' if playlist_type == 'episodes' else 'movies'} found for playlist {playlist['path']} in channel {channel_name}", virtu_logERROR)
-                    continue
-                sorted_item_groups = {}
-                ordered_shows = rule_order if rule_order else list(item_groups.keys())
-                if source == 'playlist' and is_random and playlist_type == 'episodes':
-                    random.shuffle(ordered_shows)
-                    virtu_log(f"Randomized show order for playlist {playlist['path']}: {ordered_shows}", virtu_logDEBUG)
-                elif playlist.get('fixed_show_order'):
-                    ordered_shows = [show for show in playlist['fixed_show_order'] if show in item_groups]
-                    virtu_log(f"Using fixed show order for playlist {playlist['path']}: {ordered_shows}", virtu_logINFO)
-                elif playlist.get('shuffle_shows', False):
-                    random.shuffle(ordered_shows)
-                    virtu_log(f"Shuffled show order for playlist {playlist['path']}: {ordered_shows}", virtu_logDEBUG)
-                for item_name in ordered_shows:
-                    if item_name in item_groups:
-                        sorted_item_groups[item_name] = item_groups[item_name]
-                        if playlist_type == 'episodes' and source == 'playlist':
-                            if is_random and (item_name not in playlist['random_order'] or not playlist['random_order'][item_name]):
-                                playlist['random_order'][item_name] = list(range(len(item_groups[item_name]['items'])))
-                                random.shuffle(playlist['random_order'][item_name])
-                                virtu_log(f"Generated random order for {item_name} in playlist {playlist['path']}: {playlist['random_order'][item_name]}", virtu_logINFO)
-                            if is_random:
-                                sorted_item_groups[item_name]['items'] = [
-                                    sorted_item_groups[item_name]['items'][i] for i in playlist['random_order'][item_name]
-                                ]
-                            else:
-                                sorted_item_groups[item_name]['items'].sort(key=lambda x: (int(x.get('season', 1)), int(x.get('episode', 1))))
-                        virtu_log(f"Playlist {playlist['path']} group {item_name} has {len(sorted_item_groups[item_name]['items'])} {'episodes' if playlist_type == 'episodes' else 'movies'}", virtu_logINFO)
-                all_playlists.append({
-                    'items': sorted_item_groups,
-                    'interleave': playlist.get('interleave', {'low': 1, 'high': 1, 'count': 1}),
-                    'last_index': playlist['last_index'],
-                    'random_order': playlist['random_order'],
-                    'type': playlist_type,
-                    'path': playlist['path'],
-                    'is_random': is_random,
-                    'shuffle_shows': playlist.get('shuffle_shows', False)
-                })
+            all_playlists = build_channel_playlists(channel, xbmcgui.Dialog(), progress_dialog=progress_dialog)
             if not all_playlists:
                 virtu_log(f"No valid playlists for channel {channel_name}", virtu_logERROR)
-                xbmcgui.Dialog().ok("Error", f"No valid playlists found for channel {channel_name}.")
+                xbmcgui.Dialog().notification("VirtuaTV", f"No valid playlists found for channel {channel_name}", xbmcgui.NOTIFICATION_ERROR, 3000)
                 progress_dialog.close()
                 return False
-            indices = {
-                playlist_idx: {item_name: max(0, playlist['last_index'].get(item_name, -1) + 1) for item_name in playlist['items']}
-                for playlist_idx, playlist in enumerate(all_playlists)
-            }
-            item_counts = {
-                playlist_idx: {item_name: len(item_data['items']) for item_name, item_data in playlist['items'].items()}
-                for playlist_idx, playlist in enumerate(all_playlists)
-            }
-            added_duration = 0
-            added_items = 0
-            interleaved_track_new = []
-            add_item_counters = {add_playlist_idx: 0 for add_playlist_idx in range(1, len(all_playlists))}
+            engine = ScheduleEngine(all_playlists, limit_type, to_add_duration if limit_type == 'time' else to_add_items)
+            def entries_with_progress():
+                progress_cycle = 0
+                for entry in engine.entries():
+                    if engine.cycle_count != progress_cycle:
+                        progress_cycle = engine.cycle_count
+                        if limit_type == 'items':
+                            progress = int(engine.total_items / to_add_items * 100) if to_add_items > 0 else 0
+                            message = f"Channel {channel_number}: Adding {engine.total_items}/{to_add_items} items"
+                        else:
+                            progress = int(engine.total_duration / to_add_duration * 100) if to_add_duration > 0 else 0
+                            added_hours = engine.total_duration / 3600
+                            to_add_hours = to_add_duration / 3600
+                            message = f"Channel {channel_number}: Adding {added_hours:.2f}/{to_add_hours:.2f} hours"
+                        progress_dialog.update(progress, message)
+                    yield entry
             try:
-                while (limit_type == 'time' and added_duration < to_add_duration) or (limit_type == 'items' and added_items < to_add_items):
-                    if limit_type == 'items':
-                        progress = int(added_items / to_add_items * 100) if to_add_items > 0 else 0
-                        message = f"Channel {channel_number}: Adding {added_items}/{to_add_items} items"
-                    else:
-                        progress = int(added_duration / to_add_duration * 100) if to_add_duration > 0 else 0
-                        added_hours = added_duration / 3600
-                        to_add_hours = to_add_duration / 3600
-                        message = f"Channel {channel_number}: Adding {added_hours:.2f}/{to_add_hours:.2f} hours"
-                    progress_dialog.update(progress, message)
-                    base_items = list(all_playlists[0]['items'].keys())
-                    if all_playlists[0].get('shuffle_shows', False):
-                        random.shuffle(base_items)
-                        virtu_log(f"Shuffled base items for cycle: {base_items}", virtu_logDEBUG)
-                    base_cycle = []
-                    for item_name in base_items:
-                        if (limit_type == 'time' and added_duration >= to_add_duration) or (limit_type == 'items' and added_items >= to_add_items):
-                            break
-                        item_data = all_playlists[0]['items'].get(item_name, {'items': []})
-                        items = item_data['items']
-                        num_items = item_counts[0].get(item_name, 0)
-                        if num_items == 0:
-                            virtu_log(f"No items for base playlist group {item_name} in {all_playlists[0]['path']}", virtu_logWARNING)
-                            continue
-                        item_idx = indices[0][item_name] % num_items
-                        item = items[item_idx]
-                        base_cycle.append((0, item_name, item, item_idx))
-                        episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[0]['type'] == 'episodes' else 1
-                        indices[0][item_name] = (indices[0][item_name] + episode_count) % num_items
-                        virtu_log(f"Prepared base item {item_name} index {item_idx + 1}/{num_items} for cycle", virtu_logDEBUG)
-                    if len(all_playlists) == 1:
-                        for _, item_name, item, item_idx in base_cycle:
-                            interleaved_track_new.append((item_name, item))
-                            episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[0]['type'] == 'episodes' else 1
-                            all_playlists[0]['last_index'][item_name] = (item_idx + episode_count - 1) % item_counts[0][item_name]
-                            virtu_log(
-                                f"Added base item {item_name} index {item_idx + 1}/{item_counts[0][item_name]}: {item['title']} (episodes: {episode_count}) (single playlist), updated last_index to {(item_idx + episode_count - 1) % item_counts[0][item_name]}",
-                                virtu_logDEBUG
-                            )
-                            added_items += 1
-                            added_duration += item['duration']
-                        continue
-                    new_cycle_length = len(base_items)
-                    for add_playlist_idx, add_playlist in enumerate(all_playlists[1:], 1):
-                        count = max(1, add_playlist['interleave'].get('count', 1))
-                        new_cycle_length += count
-                        virtu_log(f"New cycle length for channel {channel_name}: {new_cycle_length} (base: {len(base_items)}, additional: {count})", virtu_logDEBUG)
-                    insert_positions = {}
-                    fixed_playlists = [(idx, p) for idx, p in enumerate(all_playlists[1:], 1) if p['interleave'].get('low') == p['interleave'].get('high')]
-                    for add_playlist_idx, add_playlist in fixed_playlists:
-                        low = add_playlist['interleave'].get('low', 1)
-                        count = max(1, add_playlist['interleave'].get('count', 1))
-                        if low < 1:
-                            virtu_log(f"Invalid low value {low} for playlist {add_playlist['path']} in channel {channel_name}. Defaulting to 1.", virtu_logWARNING)
-                            xbmcgui.Dialog().ok("Invalid Low Value", f"Low value {low} for playlist {add_playlist['path']} is invalid. Must be >= 1. Defaulting to 1.")
-                            low = 1
-                        if low > new_cycle_length:
-                            virtu_log(f"Invalid low value {low} for playlist {add_playlist['path']} in channel {channel_name}. Defaulting to {new_cycle_length}.", virtu_logWARNING)
-                            xbmcgui.Dialog().ok("Invalid Low Value", f"Low value {low} for playlist {add_playlist['path']} is invalid. Must be <= {new_cycle_length}. Defaulting to {new_cycle_length}.")
-                            low = new_cycle_length
-                        pos = low
-                        insert_positions[add_playlist_idx] = pos
-                        virtu_log(f"Assigned fixed position {pos} with count {count} to playlist {add_playlist['path']}", virtu_logDEBUG)
-                    random_playlists = [(idx, p) for idx, p in enumerate(all_playlists[1:], 1) if p['interleave'].get('low') != p['interleave'].get('high')]
-                    for add_playlist_idx, add_playlist in random_playlists:
-                        low = add_playlist['interleave'].get('low', 1)
-                        high = add_playlist['interleave'].get('high', 1)
-                        count = max(1, add_playlist['interleave'].get('count', 1))
-                        if low < 1:
-                            virtu_log(f"Invalid low value {low} for playlist {add_playlist['path']} in channel {channel_name}. Defaulting to 1.", virtu_logWARNING)
-                            xbmcgui.Dialog().ok("Invalid Low Value", f"Low value {low} for playlist {add_playlist['path']} is invalid. Must be >= 1. Defaulting to 1.")
-                            low = 1
-                        if high < low:
-                            virtu_log(f"Invalid range: low ({low}) > high ({high}) for playlist {add_playlist['path']} in channel {channel_name}. Swapping values.", virtu_logWARNING)
-                            xbmcgui.Dialog().ok("Invalid Interleave Range", f"Low value ({low}) > high value ({high}) for playlist {add_playlist['path']}. Swapping values.")
-                            low, high = high, low
-                        if high > new_cycle_length:
-                            virtu_log(f"Invalid high value {high} for playlist {add_playlist['path']} in channel {channel_name}. Defaulting to {new_cycle_length}.", virtu_logWARNING)
-                            xbmcgui.Dialog().ok("Invalid High Value", f"High value {high} for playlist {add_playlist['path']} is invalid. Must be <= {new_cycle_length}. Defaulting to {new_cycle_length}.")
-                            high = new_cycle_length
-                        valid_positions = [p for p in range(1, new_cycle_length + 1) if low <= p <= min(high, new_cycle_length - count + 1)]
-                        pos = random.choice(valid_positions) if valid_positions else 1
-                        insert_positions[add_playlist_idx] = pos
-                        virtu_log(f"Assigned random position {pos} with count {count} to playlist {add_playlist['path']}", virtu_logDEBUG)
-                    shuffled_available = {}
-                    for add_playlist_idx in range(1, len(all_playlists)):
-                        add_playlist = all_playlists[add_playlist_idx]
-                        avail = list(add_playlist['items'].keys())
-                        if not avail:
-                            virtu_log(f"No available items for playlist {add_playlist['path']} in channel {channel_name}", virtu_logWARNING)
-                            continue
-                        if add_playlist.get('shuffle_shows', False):
-                            random.shuffle(avail)
-                            virtu_log(f"Shuffled additional items for cycle in playlist {add_playlist['path']}: {avail}", virtu_logDEBUG)
-                        shuffled_available[add_playlist_idx] = avail
-                    current_cycle = []
-                    current_position = 0
-                    base_idx = 0
-                    while current_position < new_cycle_length and ((limit_type == 'time' and added_duration < to_add_duration) or (limit_type == 'items' and added_items < to_add_items)):
-                        current_position += 1
-                        inserted = False
-                        for add_playlist_idx in sorted(insert_positions.keys()):
-                            add_playlist = all_playlists[add_playlist_idx]
-                            count = max(1, add_playlist['interleave'].get('count', 1))
-                            if insert_positions[add_playlist_idx] <= current_position < insert_positions[add_playlist_idx] + count:
-                                available_items = shuffled_available.get(add_playlist_idx, [])
-                                if not available_items:
-                                    virtu_log(f"No available items for playlist {add_playlist['path']} at position {current_position}", virtu_logWARNING)
-                                    continue
-                                item_idx = add_item_counters.get(add_playlist_idx, 0) % len(available_items)
-                                item_name = available_items[item_idx]
-                                item_data = add_playlist['items'].get(item_name, {'items': []})
-                                items = item_data['items']
-                                num_items = item_counts[add_playlist_idx].get(item_name, 0)
-                                if num_items == 0:
-                                    virtu_log(f"No items for playlist {add_playlist['path']} group {item_name}", virtu_logWARNING)
-                                    continue
-                                item_idx_episode = indices[add_playlist_idx][item_name] % num_items
-                                item = items[item_idx_episode]
-                                current_cycle.append((item_name, item))
-                                episode_count = get_episode_count(os.path.basename(item['file'])) if add_playlist['type'] == 'episodes' else 1
-                                add_playlist['last_index'][item_name] = (item_idx_episode + episode_count - 1) % num_items
-                                virtu_log(
-                                    f"Adding playlist {add_playlist_idx} {item_name} item {item_idx_episode + 1}/{num_items}: {item['title']} (episodes: {episode_count}) at position {current_position}, updated last_index to {(item_idx_episode + episode_count - 1) % num_items}",
-                                    virtu_logDEBUG
-                                )
-                                added_items += 1
-                                added_duration += item['duration']
-                                indices[add_playlist_idx][item_name] = (indices[add_playlist_idx][item_name] + episode_count) % num_items
-                                inserted = True
-                                add_item_counters[add_playlist_idx] = add_item_counters.get(add_playlist_idx, 0) + 1
-                                break
-                        if not inserted and base_idx < len(base_cycle) and ((limit_type == 'time' and added_duration < to_add_duration) or (limit_type == 'items' and added_items < to_add_items)):
-                            playlist_idx, item_name, item, item_idx = base_cycle[base_idx]
-                            if item_name in item_counts[playlist_idx]:
-                                current_cycle.append((item_name, item))
-                                episode_count = get_episode_count(os.path.basename(item['file'])) if all_playlists[playlist_idx]['type'] == 'episodes' else 1
-                                all_playlists[playlist_idx]['last_index'][item_name] = (item_idx + episode_count - 1) % item_counts[playlist_idx][item_name]
-                                virtu_log(
-                                    f"Adding playlist {playlist_idx} {item_name} item {item_idx + 1}/{item_counts[playlist_idx][item_name]}: {item['title']} (episodes: {episode_count}) at position {current_position}, updated last_index to {(item_idx + episode_count - 1) % item_counts[playlist_idx][item_name]}",
-                                    virtu_logDEBUG
-                                )
-                                added_items += 1
-                                added_duration += item['duration']
-                            else:
-                                virtu_log(f"Skipping base item {item_name} due to missing item_count in playlist {all_playlists[playlist_idx]['path']}", virtu_logWARNING)
-                            base_idx += 1
-                    interleaved_track_new.extend(current_cycle)
-                    virtu_log(f"Completed cycle with {len(current_cycle)} items, total_items={added_items}, total_duration={added_duration}", virtu_logDEBUG)
+                # The sidecar carries the kept entries over and indexes the new ones as they are appended
+                with schedule_index_writer(m3u_filename, schedule_index.anchor, schedule_index.positions[0]) as index_writer:
+                    index_writer.add_index(schedule_index)
+                    written, _ = append_m3u_entries(m3u_filename, entries_with_progress(), all_playlists[0], channel_name, index_writer)
+                added_items = engine.total_items
+                added_duration = engine.total_duration
+                virtu_log(f"Built {added_items} entries in {engine.cycle_count} cycles for channel {channel_name}, total_duration={added_duration}, wrote {written}", virtu_logDEBUG)
+                for warning in engine.warnings:
+                    virtu_log(f"{warning} (channel {channel_name})", virtu_logWARNING)
+                    xbmcgui.Dialog().notification("VirtuaTV", warning, xbmcgui.NOTIFICATION_WARNING, 3000)
             except Exception as e:
-                virtu_log(f"Error adding new cycle for channel {channel_name}: {str(e)}", virtu_logERROR)
+                virtu_log(f"Error appending new cycle for channel {channel_name}: {str(e)}", virtu_logERROR)
                 progress_dialog.close()
                 return False
             try:
                 for playlist_idx, playlist in enumerate(all_playlists):
                     channel['playlists'][playlist_idx]['last_index'] = {
                         item_name: all_playlists[playlist_idx]['last_index'][item_name]
-                        for item_name in playlist['items'] if item_name in item_counts[playlist_idx]
+                        for item_name in playlist['items'] if item_name in all_playlists[playlist_idx]['last_index']
                     }
                     channel['playlists'][playlist_idx]['random_order'] = {
                         item_name: all_playlists[playlist_idx]['random_order'][item_name]
                         for item_name in playlist['items'] if item_name in all_playlists[playlist_idx]['random_order']
-                        and isinstance(all_playlists[playlist_idx]['random_order'][item_name], list)
+                        and isinstance(all_playlists[playlist_idx]['random_order'][item_name], dict)
                     }
                     virtu_log(f"Updated last_index for playlist {playlist['path']}: {channel['playlists'][playlist_idx]['last_index']}", virtu_logDEBUG)
-                save_channels(channels)
-                virtu_log(f"Saved channels.json after updating last_index for channel {channel_name}", virtu_logINFO)
             except Exception as e:
-                virtu_log(f"Error saving updated last_index for channel {channel_name}: {str(e)}", virtu_logERROR)
-                progress_dialog.close()
-                return False
-            existing_m3u_lines = m3u_lines  # Use original m3u_lines from file
-            m3u_lines = ['#EXTM3U']
-            for line in existing_m3u_lines[removed_k*2+1:]:
-                m3u_lines.append(line)
-            playlist_type = all_playlists[0]['type'] if all_playlists else 'movies'
-            for item_name, item in interleaved_track_new:
-                duration = item.get('duration', 0)
-                if duration <= 0:
-                    virtu_log(f"Skipping item {item['title']} with invalid duration {duration}", virtu_logWARNING)
-                    continue
-                file_path = item['file']
-                if not xbmcvfs.exists(file_path):
-                    virtu_log(f"Inaccessible file path: {file_path}", virtu_logWARNING)
-                    xbmcgui.Dialog().notification("VirtuaTV", f"Inaccessible file path: {file_path}", xbmcgui.NOTIFICATION_WARNING, 3000)
-                    continue
-                title = item['title']
-                description = all_playlists[0]['items'].get(item_name, {}).get('description', '')
-                season_episode = f"S{item.get('season', 0):02d}E{item.get('episode', 0):02d}" if playlist_type == 'episodes' and 'season' in item and 'episode' in item else ''
-                entry_title = f"{item_name}//{title} ({season_episode})//{description}" if season_episode else f"{item_name}//{title}//{description}"
-                m3u_lines.append(f'#EXTINF:{int(duration)},{entry_title}')
-                m3u_lines.append(file_path)
-            temp_m3u = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_m3u_{os.getpid()}.m3u")
-            with xbmcvfs.File(temp_m3u, 'w') as f:
-                f.write('\n'.join(m3u_lines) + '\n')
-            if not xbmcvfs.copy(temp_m3u, m3u_filename):
-                virtu_log(f"Failed to update M3U file for channel {channel_name}", virtu_logERROR)
-                xbmcvfs.delete(temp_m3u)
+                virtu_log(f"Error updating last_index for channel {channel_name}: {str(e)}", virtu_logERROR)
                 progress_dialog.close()
                 return False
-            xbmcvfs.delete(temp_m3u)
-            channel['last_gen_time'] = now.isoformat()
-            channel['total_gen_duration'] = remaining_duration + added_duration
+            channel['last_gen_time'] = datetime.datetime.fromtimestamp(index_writer.anchor, datetime.timezone.utc).isoformat()
+            channel['total_gen_duration'] = index_writer.total_duration
             channel['is_new'] = False
-            save_channels(channels)
-            virtu_log(f"Updated files for channel {channel_number}: removed {removed_k} items, added {added_items} items, total_duration={channel['total_gen_duration']}", virtu_logINFO)
+            if persist:
+                save_channels(channels)
+            virtu_log(f"Updated files for channel {channel_number}: {played_k} items played, appended {added_items} items, total_duration={channel['total_gen_duration']}", virtu_logINFO)
             progress_dialog.close()
             return True
         except Exception as e:
@@ -1496,7 +1169,42 @@ def update_channel_files(channel_number):
         if 'progress_dialog' in locals():
             progress_dialog.close()
         return False
-        
+
+def build_channels_parallel(channels, channel_numbers, builder):
+    """Run builder(channel_number, channels) for several channels on a bounded worker pool.
+
+    Each build gets its own copy of its channel, so workers never share cursor state; the rebuilt
+    channels are merged back into channels and saved in one go. Returns {channel number: success}.
+    """
+    results = {}
+    if not channel_numbers:
+        return results
+    workers = max(1, min(int(ADDON.getSetting('regen_workers') or 2), len(channel_numbers)))
+    virtu_log(f"Building {len(channel_numbers)} channels with {workers} workers using {builder.__name__}", virtu_logINFO)
+    def build(channel_number):
+        isolated = [copy.deepcopy(ch) for ch in channels if ch['number'] == channel_number]
+        try:
+            return builder(channel_number, isolated), isolated
+        finally:
+            release_database_connections()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build, channel_number): channel_number for channel_number in channel_numbers}
+        for future in as_completed(futures):
+            channel_number = futures[future]
+            try:
+                success, isolated = future.result()
+            except Exception as e:
+                virtu_log(f"Error building channel {channel_number}: {str(e)}\n{traceback.format_exc()}", virtu_logERROR)
+                success, isolated = False, []
+            results[channel_number] = success
+            if success and isolated:
+                for idx, ch in enumerate(channels):
+                    if ch['number'] == channel_number:
+                        channels[idx] = isolated[0]
+    if any(results.values()):
+        save_channels(channels)
+    return results
+
 def pre_load_channels():
     """Check and update channels on startup if outdated or new."""
     virtu_log("pre_load_channels: Starting channel update check", virtu_logINFO)
@@ -1511,6 +1219,7 @@ def pre_load_channels():
     successful = 0
     total_channels = len(channels)
     try:
+        due = []
         for idx, channel in enumerate(channels):
             channel_name = channel.get('name', 'Unknown')
             channel_number = channel.get('number', -1)
@@ -1526,28 +1235,24 @@ def pre_load_channels():
                     virtu_log(f"pre_load_channels: Channel {channel_name} (number {channel_number}): time_left={time_left}, threshold={threshold_sec}, is_new={channel.get('is_new', False)}", virtu_logINFO)
                     if time_left < threshold_sec or channel.get('is_new', False):
                         virtu_log(f"pre_load_channels: Updating channel {channel_name} (time_left={time_left} < {threshold_sec} or is_new={channel.get('is_new', False)})", virtu_logINFO)
-                        if update_channel_files(channel_number):
-                            successful += 1
-                            channel['is_new'] = False
-                            virtu_log(f"pre_load_channels: Successfully updated channel {channel_name} ({channel_number})", virtu_logINFO)
-                        else:
-                            virtu_log(f"pre_load_channels: Failed to update channel {channel_name} ({channel_number})", virtu_logERROR)
-                            xbmcgui.Dialog().notification("VirtuaTV", f"Failed to update channel {channel_name} ({channel_number})", xbmcgui.NOTIFICATION_ERROR, 3000, sound=False)
+                        due.append(channel_number)
                     else:
                         virtu_log(f"pre_load_channels: Channel {channel_name} does not need update (time_left={time_left} >= {threshold_sec})", virtu_logINFO)
                 else:
                     virtu_log(f"pre_load_channels: Channel {channel_name} missing last_gen_time or total_gen_duration, forcing update", virtu_logWARNING)
-                    if update_channel_files(channel_number):
-                        successful += 1
-                        channel['is_new'] = False
-                        virtu_log(f"pre_load_channels: Successfully updated channel {channel_name} ({channel_number})", virtu_logINFO)
-                    else:
-                        virtu_log(f"pre_load_channels: Failed to update channel {channel_name} ({channel_number})", virtu_logERROR)
-                        xbmcgui.Dialog().notification("VirtuaTV", f"Failed to update channel {channel_name} ({channel_number})", xbmcgui.NOTIFICATION_ERROR, 3000, sound=False)
+                    due.append(channel_number)
             except Exception as e:
                 virtu_log(f"pre_load_channels: Error processing channel {channel_name}: {str(e)}", virtu_logERROR)
                 xbmcgui.Dialog().notification("VirtuaTV", f"Error updating channel {channel_name}: {str(e)}", xbmcgui.NOTIFICATION_ERROR, 3000, sound=False)
-        save_channels(channels)
+        results = build_channels_parallel(channels, due, update_channel_files)
+        for channel_number, success in results.items():
+            channel_name = next((ch.get('name', 'Unknown') for ch in channels if ch['number'] == channel_number), 'Unknown')
+            if success:
+                successful += 1
+                virtu_log(f"pre_load_channels: Successfully updated channel {channel_name} ({channel_number})", virtu_logINFO)
+            else:
+                virtu_log(f"pre_load_channels: Failed to update channel {channel_name} ({channel_number})", virtu_logERROR)
+                xbmcgui.Dialog().notification("VirtuaTV", f"Failed to update channel {channel_name} ({channel_number})", xbmcgui.NOTIFICATION_ERROR, 3000, sound=False)
         if successful > 0:
             if sync_files():
                 xbmcgui.Dialog().notification("VirtuaTV", f"Updated {successful}/{total_channels} channels", xbmcgui.NOTIFICATION_INFO, 3000, sound=False)
@@ -1581,10 +1286,7 @@ def select_playlist():
         return None
     playlist_path = os.path.join(playlist_dir, playlists[selected])
     try:
-        with xbmcvfs.File(playlist_path, 'r') as f:
-            xml_content = f.read()
-        tree = ET.fromstring(xml_content)
-        playlist_type = tree.attrib.get('type')
+        playlist_type = load_smart_playlist(playlist_path).type
         if playlist_type is None or playlist_type not in ['episodes', 'movies']:
             xbmcgui.Dialog().ok("Error", "Selected playlist must be of type 'episodes' or 'movies'!")
             return None
@@ -1601,96 +1303,666 @@ def get_latest_db_version():
         return max(versions)
     return 131  # Default to latest known if no files found
 
-def get_database_connection():
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHE_SIZE_KB = 16384
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+SQLITE_CONNECT_RETRIES = 3
+
+def connect_sqlite(db_path):
+    """Open the local video database so our reads never block Kodi's own writers.
+    In read-only mode the file is opened with mode=ro and query_only; lock errors are retried with backoff."""
+    read_only = ADDON.getSettingBool('db_readonly')
+    for attempt in range(SQLITE_CONNECT_RETRIES):
+        conn = None
+        try:
+            if read_only:
+                try:
+                    conn = sqlite3.connect(f"file:{urllib.request.pathname2url(db_path)}?mode=ro", uri=True, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+                except sqlite3.OperationalError as e:
+                    if 'locked' in str(e) or 'busy' in str(e):
+                        raise
+                    # A WAL database without a writable -shm cannot be opened with mode=ro
+                    virtu_log(f"VirtuaTV: Read-only open of {db_path} failed ({str(e)}), falling back to query_only", virtu_logWARNING)
+                    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+                conn.execute("PRAGMA query_only = ON")
+            else:
+                conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            return conn
+        except sqlite3.OperationalError as e:
+            if conn:
+                conn.close()
+            if ('locked' not in str(e) and 'busy' not in str(e)) or attempt == SQLITE_CONNECT_RETRIES - 1:
+                raise
+            virtu_log(f"VirtuaTV: SQLite database busy ({str(e)}), retrying ({attempt + 1}/{SQLITE_CONNECT_RETRIES})", virtu_logWARNING)
+            time.sleep(0.5 * (attempt + 1))
+
+def resolve_database_targets():
+    """Databases to try, in order: MySQL from settings, MySQL from advancedsettings.xml, then the newest local SQLite."""
     db_host = ADDON.getSetting('db_host')
     db_port = int(ADDON.getSetting('db_port') or 3306)
     db_user = ADDON.getSetting('db_user')
     db_pass = ADDON.getSetting('db_pass')
     db_name = ADDON.getSetting('db_name') or 'MyVideos'
-    conn = None
-    cursor = None
-    db_type = None
-    db_version = ''
+    targets = []
     latest_version = get_latest_db_version()
     if db_host:
         if mysql is None:
             virtu_log("VirtuaTV: MySQL connector not available, cannot connect to remote DB", virtu_logERROR)
             xbmcgui.Dialog().ok("DB Error", "MySQL connector not imported, cannot connect to remote database.")
-            return None, None, None, ''
+            return targets
         if not re.match(r'.*\d+$', db_name.lower()):
             db_name += str(latest_version)
+        targets.append({
+            'type': 'mysql', 'source': 'settings',
+            'params': {'host': db_host, 'port': db_port, 'user': db_user, 'password': db_pass, 'database': db_name},
+            'version': re.search(r'\d+$', db_name).group(0) if re.search(r'\d+$', db_name) else ''
+        })
+        return targets
+    adv_path = xbmcvfs.translatePath('special://profile/advancedsettings.xml')
+    if xbmcvfs.exists(adv_path):
         try:
-            conn = mysql.connector.connect(host=db_host, port=db_port, user=db_user, password=db_pass, database=db_name)
-            cursor = conn.cursor(buffered=True)
-            db_type = 'mysql'
-            db_version = re.search(r'\d+$', db_name).group(0) if re.search(r'\d+$', db_name) else ''
-            virtu_log(f"VirtuaTV: Connected to MySQL DB using settings with database {db_name}", virtu_logINFO)
-            return conn, cursor, db_type, db_version
+            with xbmcvfs.File(adv_path, 'r') as f:
+                content = f.read()
+            tree = ET.fromstring(content)
+            videodb = tree.find('./videodatabase')
+            if videodb is not None:
+                db_type_elem = videodb.find('type')
+                if db_type_elem is not None and db_type_elem.text == 'mysql':
+                    if mysql is None:
+                        virtu_log("VirtuaTV: MySQL connector not available for advancedsettings.xml config", virtu_logERROR)
+                        return targets
+                    db_host = videodb.find('host').text if videodb.find('host') is not None else None
+                    db_port = int(videodb.find('port').text) if videodb.find('port') is not None else 3306
+                    db_user = videodb.find('user').text if videodb.find('user') is not None else None
+                    db_pass = videodb.find('pass').text if videodb.find('pass') is not None else None
+                    db_name = videodb.find('name').text if videodb.find('name') is not None else 'myvideos'
+                    if not re.match(r'.*\d+$', db_name.lower()):
+                        db_name += str(latest_version)
+                    if db_host and db_user:
+                        targets.append({
+                            'type': 'mysql', 'source': 'advancedsettings.xml',
+                            'params': {'host': db_host, 'port': db_port, 'user': db_user, 'password': db_pass, 'database': db_name},
+                            'version': re.search(r'\d+$', db_name).group(0) if re.search(r'\d+$', db_name) else ''
+                        })
         except Exception as e:
-            virtu_log(f"VirtuaTV: MySQL connection error using settings: {str(e)}", virtu_logERROR)
-            xbmcgui.Dialog().ok("DB Error", f"Failed to connect to MySQL using settings: {str(e)}")
-    else:
-        adv_path = xbmcvfs.translatePath('special://profile/advancedsettings.xml')
-        if xbmcvfs.exists(adv_path):
+            virtu_log(f"VirtuaTV: Error parsing advancedsettings.xml: {str(e)}", virtu_logERROR)
+    # Fallback to local SQLite if no MySQL or error
+    db_dir = xbmcvfs.translatePath('special://database/')
+    db_files = [f for f in xbmcvfs.listdir(db_dir)[1] if f.startswith('MyVideos') and f.endswith('.db')]
+    if db_files:
+        db_files.sort(key=lambda f: int(re.search(r'MyVideos(\d+).db', f).group(1)), reverse=True)
+        db_path = os.path.join(db_dir, db_files[0])
+        targets.append({
+            'type': 'sqlite', 'source': 'local',
+            'path': db_path,
+            'version': re.search(r'MyVideos(\d+).db', db_path).group(1) if re.search(r'MyVideos(\d+).db', db_path) else ''
+        })
+    elif not targets:
+        virtu_log("VirtuaTV: No MyVideos database found", virtu_logERROR)
+        xbmcgui.Dialog().ok("DB Error", "No video database found. Ensure your library is scanned.")
+    return targets
+
+class PooledConnection:
+    """Connection handle whose close() leaves the connection open in DatabasePool for the next caller."""
+    def __init__(self, conn):
+        self._conn = conn
+    def close(self):
+        pass
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+DB_TARGET_TTL = 300  # Seconds before database targets are resolved again, e.g. to notice a MyVideosNNN upgrade
+
+class DatabasePool:
+    """Process-wide database access: each thread reuses one open connection until release() ends its pass.
+    Targets are resolved again after DB_TARGET_TTL or reset(). When they change, the generation moves on and
+    each thread swaps to a new connection on its next get(); the old one is closed when that thread releases,
+    so cursors still in use are never closed under it. MySQL connections are pinged (and reconnected) before reuse."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.targets = None
+        self.resolved_at = 0
+        self.generation = 0
+        self.failed = set()
+    def open(self, target):
+        if target['type'] == 'mysql':
+            conn = mysql.connector.connect(**target['params'])
+            virtu_log(f"VirtuaTV: Connected to MySQL DB using {target['source']} with database {target['params']['database']}", virtu_logINFO)
+        else:
+            conn = connect_sqlite(target['path'])
+            virtu_log(f"VirtuaTV: Connected to local SQLite DB: {target['path']}", virtu_logINFO)
+        return conn
+    def current_targets(self):
+        """Return (enumerated targets, generation), resolving the targets again once they are stale."""
+        with self.lock:
+            if self.targets is None or time.time() - self.resolved_at > DB_TARGET_TTL:
+                targets = resolve_database_targets()
+                if self.targets is not None and targets != self.targets:
+                    self.generation += 1
+                    self.failed = set()
+                    virtu_log(f"VirtuaTV: Database targets changed, moving pooled connections to generation {self.generation}", virtu_logINFO)
+                self.targets = targets
+                self.resolved_at = time.time()
+            return list(enumerate(self.targets)), self.generation
+    def get(self):
+        """Return (conn, cursor, db_type, db_version) for the calling thread, or Nones if no database is reachable."""
+        targets, generation = self.current_targets()
+        pooled = getattr(self.local, 'pooled', None)
+        if pooled is not None and pooled[2] != generation:
+            self.retire()
+            pooled = None
+        if pooled is not None:
+            conn, target, _ = pooled
             try:
-                with xbmcvfs.File(adv_path, 'r') as f:
-                    content = f.read()
-                tree = ET.fromstring(content)
-                videodb = tree.find('./videodatabase')
-                if videodb is not None:
-                    db_type_elem = videodb.find('type')
-                    if db_type_elem is not None and db_type_elem.text == 'mysql':
-                        if mysql is None:
-                            virtu_log("VirtuaTV: MySQL connector not available for advancedsettings.xml config", virtu_logERROR)
-                            return None, None, None, ''
-                        db_host = videodb.find('host').text if videodb.find('host') is not None else None
-                        db_port = int(videodb.find('port').text) if videodb.find('port') is not None else 3306
-                        db_user = videodb.find('user').text if videodb.find('user') is not None else None
-                        db_pass = videodb.find('pass').text if videodb.find('pass') is not None else None
-                        db_name = videodb.find('name').text if videodb.find('name') is not None else 'myvideos'
-                        if not re.match(r'.*\d+$', db_name.lower()):
-                            db_name += str(latest_version)
-                        if db_host and db_user:
-                            try:
-                                conn = mysql.connector.connect(host=db_host, port=db_port, user=db_user, password=db_pass, database=db_name)
-                                cursor = conn.cursor(buffered=True)
-                                db_type = 'mysql'
-                                db_version = re.search(r'\d+$', db_name).group(0) if re.search(r'\d+$', db_name) else ''
-                                virtu_log(f"VirtuaTV: Connected to MySQL DB using advancedsettings.xml with database {db_name}", virtu_logINFO)
-                                return conn, cursor, db_type, db_version
-                            except Exception as e:
-                                virtu_log(f"VirtuaTV: MySQL connection error using advancedsettings.xml: {str(e)}", virtu_logERROR)
-                                xbmcgui.Dialog().ok("DB Error", f"Failed to connect to MySQL using advancedsettings.xml: {str(e)}")
+                if target['type'] == 'mysql':
+                    conn.ping(reconnect=True, attempts=2, delay=1)
+                cursor = conn.cursor(buffered=True) if target['type'] == 'mysql' else conn.cursor()
+                return PooledConnection(conn), cursor, target['type'], target['version']
             except Exception as e:
-                virtu_log(f"VirtuaTV: Error parsing advancedsettings.xml: {str(e)}", virtu_logERROR)
-        # Fallback to local SQLite if no MySQL or error
-        db_dir = xbmcvfs.translatePath('special://database/')
-        db_files = [f for f in xbmcvfs.listdir(db_dir)[1] if f.startswith('MyVideos') and f.endswith('.db')]
-        if db_files:
-            db_files.sort(key=lambda f: int(re.search(r'MyVideos(\d+).db', f).group(1)), reverse=True)
-            db_path = os.path.join(db_dir, db_files[0])
+                virtu_log(f"VirtuaTV: Pooled {target['type']} connection lost ({str(e)}), reconnecting", virtu_logWARNING)
+                self.discard(conn)
+        for idx, target in targets:
+            if idx in self.failed:
+                continue
             try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                db_type = 'sqlite'
-                db_version = re.search(r'MyVideos(\d+).db', db_path).group(1) if re.search(r'MyVideos(\d+).db', db_path) else ''
-                virtu_log(f"VirtuaTV: Connected to local SQLite DB: {db_path}", virtu_logINFO)
+                conn = self.open(target)
             except Exception as e:
-                virtu_log(f"VirtuaTV: SQLite connection error: {str(e)}", virtu_logERROR)
-                xbmcgui.Dialog().ok("DB Error", f"Failed to connect to local SQLite: {str(e)}")
-        else:
-            virtu_log("VirtuaTV: No MyVideos database found", virtu_logERROR)
-            xbmcgui.Dialog().ok("DB Error", "No video database found. Ensure your library is scanned.")
-    return conn, cursor, db_type, db_version
+                with self.lock:
+                    self.failed.add(idx)
+                if target['type'] == 'mysql':
+                    virtu_log(f"VirtuaTV: MySQL connection error using {target['source']}: {str(e)}", virtu_logERROR)
+                    xbmcgui.Dialog().ok("DB Error", f"Failed to connect to MySQL using {target['source']}: {str(e)}")
+                else:
+                    virtu_log(f"VirtuaTV: SQLite connection error: {str(e)}", virtu_logERROR)
+                    xbmcgui.Dialog().ok("DB Error", f"Failed to connect to local SQLite: {str(e)}")
+                continue
+            self.local.pooled = (conn, target, generation)
+            cursor = conn.cursor(buffered=True) if target['type'] == 'mysql' else conn.cursor()
+            return PooledConnection(conn), cursor, target['type'], target['version']
+        return None, None, None, ''
+    def retire(self):
+        """Set the calling thread's connection aside for release() to close."""
+        pooled = getattr(self.local, 'pooled', None)
+        if pooled is not None:
+            self.local.retired = getattr(self.local, 'retired', []) + [pooled[0]]
+            self.local.pooled = None
+    def discard(self, conn):
+        self.local.pooled = None
+        try:
+            conn.close()
+        except Exception:
+            pass
+    def release(self):
+        """Close the calling thread's connections at the end of its pass; the resolved targets are kept."""
+        pooled = getattr(self.local, 'pooled', None)
+        with self.lock:
+            self.failed = set()
+        for conn in getattr(self.local, 'retired', []):
+            self.discard(conn)
+        self.local.retired = []
+        if pooled is not None:
+            self.discard(pooled[0])
+            virtu_log(f"VirtuaTV: Released pooled {pooled[1]['type']} connection", virtu_logDEBUG)
+    def reset(self):
+        """Resolve the targets again on the next get(), e.g. after the database settings changed.
+        Connections other threads are using stay open until those threads release them."""
+        with self.lock:
+            self.targets = None
+            self.generation += 1
+            self.failed = set()
 
-def get_playlist_items_with_durations(playlist_path, playlist_type, source='playlist'):
+DB_POOL = DatabasePool()
+
+def get_database_connection():
+    return DB_POOL.get()
+
+def release_database_connections():
+    """End of a pass: close this thread's pooled database connection."""
+    DB_POOL.release()
+
+DB_LOOKUP_CHUNK_SIZE = 500  # Stays below SQLite's default limit of 999 bound parameters
+
+def query_rows_for_items(cursor, db_type, items, query_template, id_query_template=None):
+    """Run a lookup for all items in chunked IN queries and return {file: remaining columns},
+    keeping the first row found for each file.
+    Items carrying a library id (dbid) are matched through id_query_template, which must select
+    idEpisode/idMovie first and filter on it with an {in_clause}. All other items fall back to
+    query_template, which must select path.strPath and files.strFilename first and filter
+    files.strFilename with an {in_clause}."""
+    placeholder = '%s' if db_type == 'mysql' else '?'
+    results = {}
+    path_items = items
+    if id_query_template:
+        wanted_ids = {}
+        path_items = []
+        for item in items:
+            if item.get('dbid') is not None:
+                wanted_ids.setdefault(item['dbid'], []).append(item['file'])
+            else:
+                path_items.append(item)
+        ids = list(wanted_ids.keys())
+        for start in range(0, len(ids), DB_LOOKUP_CHUNK_SIZE):
+            chunk = ids[start:start + DB_LOOKUP_CHUNK_SIZE]
+            cursor.execute(id_query_template.format(in_clause=', '.join([placeholder] * len(chunk))), tuple(chunk))
+            for row in cursor.fetchall():
+                for file_path in wanted_ids.get(row[0], []):
+                    results.setdefault(file_path, tuple(row[1:]))
+        # Ids the database no longer knows (e.g. a rescan in between) still get a path lookup
+        path_items += [item for item in items if item.get('dbid') is not None and item['file'] not in results]
+    if not path_items:
+        return results
+    # MySQL compares strings with a case-insensitive collation, SQLite with a binary one
+    normalize = (lambda value: value.lower()) if db_type == 'mysql' else (lambda value: value)
+    wanted = {}
+    for item in path_items:
+        filename = os.path.basename(item['file'])
+        path = os.path.dirname(item['file']) + '/'
+        wanted.setdefault(filename, {}).setdefault(normalize(path), []).append(item['file'])
+    filenames = list(wanted.keys())
+    for start in range(0, len(filenames), DB_LOOKUP_CHUNK_SIZE):
+        chunk = filenames[start:start + DB_LOOKUP_CHUNK_SIZE]
+        cursor.execute(query_template.format(in_clause=', '.join([placeholder] * len(chunk))), tuple(chunk))
+        for row in cursor.fetchall():
+            for file_path in wanted.get(row[1], {}).get(normalize(row[0]), []):
+                results.setdefault(file_path, tuple(row[2:]))
+    return results
+
+def get_durations_bulk(cursor, db_type, playlist_type, items, lookup_cache=None):
+    """Look up durations for all items with chunked IN queries instead of one query per item,
+    joining on idEpisode/idMovie where the item has a library id. Files already in lookup_cache,
+    a dict shared by the lookups of one build, are not queried again.
+    Returns {file: (duration, studio)} keeping the first row found for each file."""
+    if playlist_type == 'episodes':
+        query = """
+        SELECT path.strPath, files.strFilename, streamdetails.iVideoDuration, tvshow.c14
+        FROM streamdetails
+        JOIN files ON streamdetails.idFile = files.idFile
+        JOIN path ON files.idPath = path.idPath
+        JOIN episode ON files.idFile = episode.idFile
+        JOIN tvshow ON episode.idShow = tvshow.idShow
+        WHERE files.strFilename IN ({in_clause}) AND streamdetails.iStreamType = 0
+        """
+        id_query = """
+        SELECT episode.idEpisode, streamdetails.iVideoDuration, tvshow.c14
+        FROM episode
+        JOIN streamdetails ON streamdetails.idFile = episode.idFile
+        JOIN tvshow ON episode.idShow = tvshow.idShow
+        WHERE episode.idEpisode IN ({in_clause}) AND streamdetails.iStreamType = 0
+        """
+    else:
+        query = """
+        SELECT path.strPath, files.strFilename, streamdetails.iVideoDuration, movie.c18
+        FROM streamdetails
+        JOIN files ON streamdetails.idFile = files.idFile
+        JOIN path ON files.idPath = path.idPath
+        JOIN movie ON files.idFile = movie.idFile
+        WHERE files.strFilename IN ({in_clause}) AND streamdetails.iStreamType = 0
+        """
+        id_query = """
+        SELECT movie.idMovie, streamdetails.iVideoDuration, movie.c18
+        FROM movie
+        JOIN streamdetails ON streamdetails.idFile = movie.idFile
+        WHERE movie.idMovie IN ({in_clause}) AND streamdetails.iStreamType = 0
+        """
+    cached = {}
+    if lookup_cache is not None:
+        cached = {item['file']: lookup_cache[('duration', item['file'])] for item in items if ('duration', item['file']) in lookup_cache}
+    results = query_rows_for_items(cursor, db_type, [item for item in items if item['file'] not in cached], query, id_query)
+    if lookup_cache is not None:
+        for file_path, row in results.items():
+            lookup_cache[('duration', file_path)] = row
+    results.update(cached)
+    virtu_log(f"Bulk duration lookup matched {len(results)} of {len(items)} {playlist_type}, {len(cached)} already looked up", virtu_logDEBUG)
+    return results
+
+def get_metadata_bulk(cursor, db_type, playlist_type, items, lookup_cache=None):
+    """Resolve show (episodes) or movie metadata for all items of a playlist in batch queries.
+    Episodes are mapped to their idShow first, so every episode of a show shares one tvshow row, and
+    shows already in lookup_cache, a dict shared by the lookups of one build, are not fetched again.
+    Nothing outlives the build, so edits to show or movie info show up on the next one.
+    Returns {file: (name, description, genre, date)}."""
+    placeholder = '%s' if db_type == 'mysql' else '?'
+    metadata = {}
+    if playlist_type == 'episodes':
+        file_ids = query_rows_for_items(cursor, db_type, items, """
+            SELECT path.strPath, files.strFilename, episode.idShow
+            FROM episode
+            JOIN files ON episode.idFile = files.idFile
+            JOIN path ON files.idPath = path.idPath
+            WHERE files.strFilename IN ({in_clause})
+            """, """
+            SELECT idEpisode, idShow FROM episode WHERE idEpisode IN ({in_clause})
+            """)
+        shows = lookup_cache if lookup_cache is not None else {}
+        show_ids = list({row[0] for row in file_ids.values() if ('tvshow', row[0]) not in shows})
+        for start in range(0, len(show_ids), DB_LOOKUP_CHUNK_SIZE):
+            chunk = show_ids[start:start + DB_LOOKUP_CHUNK_SIZE]
+            cursor.execute(
+                f"SELECT idShow, c00, c01, c08, c05 FROM tvshow WHERE idShow IN ({', '.join([placeholder] * len(chunk))})",
+                tuple(chunk)
+            )
+            for id_show, name, description, genre, date in cursor.fetchall():
+                shows[('tvshow', id_show)] = (name, description, genre, date)
+        for file_path, row in file_ids.items():
+            if ('tvshow', row[0]) in shows:
+                metadata[file_path] = shows[('tvshow', row[0])]
+    else:
+        file_ids = query_rows_for_items(cursor, db_type, items, """
+            SELECT path.strPath, files.strFilename, movie.idMovie, movie.c00, movie.c01, movie.c06, movie.c07
+            FROM movie
+            JOIN files ON movie.idFile = files.idFile
+            JOIN path ON files.idPath = path.idPath
+            WHERE files.strFilename IN ({in_clause})
+            """, """
+            SELECT idMovie, idMovie, c00, c01, c06, c07 FROM movie WHERE idMovie IN ({in_clause})
+            """)
+        for file_path, (id_movie, name, description, genre, date) in file_ids.items():
+            metadata[file_path] = (name, description, genre, date)
+    virtu_log(f"Bulk metadata lookup matched {len(metadata)} of {len(items)} {playlist_type}", virtu_logDEBUG)
+    return metadata
+
+class SmartPlaylist:
+    """A parsed .xsp: type, match, order, rule order and the raw rule elements."""
+    def __init__(self, path, content):
+        self.path = path
+        self.hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        self.tree = ET.fromstring(content)
+        self.type = self.tree.attrib.get('type')
+        match_elem = self.tree.find('match')
+        self.match = match_elem.text if match_elem is not None and match_elem.text else 'all'
+        order_elem = self.tree.find('.//order')
+        self.order = order_elem.text if order_elem is not None and order_elem.text else 'none'
+        self.is_random = self.order == 'random'
+        self.rules = self.tree.findall('rule')
+        self.rule_order = {}
+        for playlist_type in ('episodes', 'movies'):
+            rule_order = []
+            for smartplaylist in self.tree.findall('.//smartplaylist'):
+                for rule in smartplaylist.findall('.//rule'):
+                    if rule.get('field') in ['title', 'tvshow', 'studio']:
+                        value = rule.find('value').text if rule.find('value') is not None else rule.text
+                        if value and isinstance(value, str):
+                            if rule.get('field') == 'tvshow' and playlist_type == 'episodes':
+                                rule_order.append(value)
+                            elif rule.get('field') == 'title' and playlist_type == 'movies':
+                                rule_order.append(value)
+                            elif rule.get('field') == 'studio' and value not in rule_order:
+                                rule_order.append(value)
+            self.rule_order[playlist_type] = rule_order
+
+PARSED_PLAYLISTS = {}  # translated path -> (mtime, size, SmartPlaylist)
+PARSED_PLAYLISTS_LOCK = threading.Lock()
+
+def load_smart_playlist(playlist_path):
+    """Parse a .xsp at most once per process, re-reading it only when its mtime or size changes.
+    Raises on unreadable or malformed files like a direct read would."""
+    real_path = xbmcvfs.translatePath(playlist_path)
+    stat = xbmcvfs.Stat(playlist_path)
+    stamp = (stat.st_mtime(), stat.st_size())
+    with PARSED_PLAYLISTS_LOCK:
+        cached = PARSED_PLAYLISTS.get(real_path)
+    if cached and cached[:2] == stamp:
+        return cached[2]
+    with xbmcvfs.File(playlist_path, 'r') as f:
+        parsed = SmartPlaylist(playlist_path, f.read())
+    with PARSED_PLAYLISTS_LOCK:
+        PARSED_PLAYLISTS[real_path] = stamp + (parsed,)
+    virtu_log(f"Parsed smart playlist {playlist_path} (type {parsed.type}, match {parsed.match}, order {parsed.order})", virtu_logDEBUG)
+    return parsed
+
+def normalize_playlist_path(playlist_path):
+    """Map a smart playlist path to its special://profile/playlists/video/ location."""
+    playlist_path = xbmcvfs.translatePath(playlist_path).replace('\\', '/')
+    if not playlist_path.startswith('special://'):
+        playlist_path = f"special://profile/playlists/video/{os.path.basename(playlist_path)}"
+    return playlist_path
+
+def get_jsonrpc_duration(item):
+    """Duration in seconds reported by Files.GetDirectory, preferring the scanned stream over the scraped runtime."""
+    video_streams = (item.get('streamdetails') or {}).get('video') or []
+    duration = video_streams[0].get('duration', 0) if video_streams else 0
+    if not duration:
+        duration = item.get('runtime', 0)
+    try:
+        return int(duration or 0)
+    except (TypeError, ValueError):
+        return 0
+
+# Smart playlist fields the SQL compiler understands, per playlist type. Plain fields map to a column
+# expression, linked fields to (link table, media_type, id column) for an EXISTS over genre/studio links.
+XSP_SQL_FIELDS = {
+    'episodes': {
+        'tvshow': 'tvshow.c00',
+        'title': 'episode.c00',
+        'year': 'SUBSTR(episode.c05, 1, 4)',
+        'playcount': 'COALESCE(files.playCount, 0)',
+        'genre': ('genre', 'tvshow', 'tvshow.idShow'),
+        'studio': ('studio', 'tvshow', 'tvshow.idShow')
+    },
+    'movies': {
+        'title': 'movie.c00',
+        'year': 'SUBSTR(movie.premiered, 1, 4)',
+        'playcount': 'COALESCE(files.playCount, 0)',
+        'genre': ('genre', 'movie', 'movie.idMovie'),
+        'studio': ('studio', 'movie', 'movie.idMovie')
+    }
+}
+XSP_SQL_NUMERIC_FIELDS = ('year', 'playcount')
+XSP_SQL_LIKE_ESCAPE = '!'  # Not a backslash, which MySQL would also treat as a string literal escape
+XSP_SQL_ORDERS = {
+    'episodes': {
+        'title': ['episode.c00'],
+        'tvshow': ['tvshow.c00', 'season', 'episode'],
+        'episode': ['season', 'episode'],
+        'year': ['episode.c05'],
+        'dateadded': ['files.dateAdded'],
+        'playcount': ['COALESCE(files.playCount, 0)']
+    },
+    'movies': {
+        'title': ['movie.c00'],
+        'year': ['movie.premiered'],
+        'dateadded': ['files.dateAdded'],
+        'playcount': ['COALESCE(files.playCount, 0)']
+    }
+}
+XSP_SQL_SELECT = {
+    'episodes': """
+        SELECT episode.idEpisode, path.strPath, files.strFilename, episode.c00, tvshow.c00,
+               CAST(episode.c12 AS {int_type}) AS season, CAST(episode.c13 AS {int_type}) AS episode,
+               streamdetails.iVideoDuration, episode.c09, tvshow.c14
+        FROM episode
+        JOIN files ON episode.idFile = files.idFile
+        JOIN path ON files.idPath = path.idPath
+        JOIN tvshow ON episode.idShow = tvshow.idShow
+        LEFT JOIN streamdetails ON streamdetails.idFile = episode.idFile AND streamdetails.iStreamType = 0
+        """,
+    'movies': """
+        SELECT movie.idMovie, path.strPath, files.strFilename, movie.c00, '',
+               -1, -1,
+               streamdetails.iVideoDuration, movie.c11, movie.c18
+        FROM movie
+        JOIN files ON movie.idFile = files.idFile
+        JOIN path ON files.idPath = path.idPath
+        LEFT JOIN streamdetails ON streamdetails.idFile = movie.idFile AND streamdetails.iStreamType = 0
+        """
+}
+
+def compile_xsp_rule(rule, playlist_type, db_type):
+    """SQL condition and parameters for one smart playlist rule, or None if the rule is not supported."""
+    placeholder = '%s' if db_type == 'mysql' else '?'
+    field = rule.get('field')
+    operator = rule.get('operator', 'is')
+    column = XSP_SQL_FIELDS[playlist_type].get(field)
+    if column is None or rule.findall('rule'):
+        return None
+    values = [value.text or '' for value in rule.findall('value')] or ([rule.text.strip()] if rule.text and rule.text.strip() else [])
+    if not values:
+        return None
+    numeric = field in XSP_SQL_NUMERIC_FIELDS
+    if numeric:
+        operators = {'is': f"= {placeholder}", 'isnot': f"= {placeholder}", 'greaterthan': f"> {placeholder}", 'lessthan': f"< {placeholder}"}
+        try:
+            values = [int(value) for value in values]
+        except ValueError:
+            return None
+        if field == 'year':
+            column = f"CAST({column} AS {'SIGNED' if db_type == 'mysql' else 'INTEGER'})"
+    else:
+        # Kodi matches text rules case-insensitively, so even is/isnot go through LIKE (never = on SQLite's
+        # binary collation), with the wildcards in the values themselves escaped
+        like = f"LIKE {placeholder} ESCAPE '{XSP_SQL_LIKE_ESCAPE}'"
+        operators = {'is': like, 'isnot': like, 'contains': like, 'doesnotcontain': like, 'startswith': like, 'endswith': like}
+        values = [value.replace(XSP_SQL_LIKE_ESCAPE, XSP_SQL_LIKE_ESCAPE * 2).replace('%', XSP_SQL_LIKE_ESCAPE + '%').replace('_', XSP_SQL_LIKE_ESCAPE + '_') for value in values]
+    if operator not in operators:
+        return None
+    patterns = {'contains': '%{}%', 'doesnotcontain': '%{}%', 'startswith': '{}%', 'endswith': '%{}'}
+    params = [patterns[operator].format(value) if operator in patterns else value for value in values]
+    # Values of a rule are alternatives; negated operators exclude all of them
+    negated = operator in ('isnot', 'doesnotcontain')
+    if isinstance(column, tuple):
+        link, media_type, id_column = column
+        condition = ' OR '.join([f"{link}.name {operators[operator]}"] * len(params))
+        condition = (
+            f"EXISTS (SELECT 1 FROM {link}_link JOIN {link} ON {link}_link.{link}_id = {link}.{link}_id"
+            f" WHERE {link}_link.media_id = {id_column} AND {link}_link.media_type = '{media_type}' AND ({condition}))"
+        )
+        if negated:
+            condition = f"NOT {condition}"
+    else:
+        condition = ' OR '.join([f"{column} {operators[operator]}"] * len(params))
+        condition = f"({condition})"
+        if negated:
+            # NOT of a comparison with NULL is still NULL, which would drop rows that have no value at all
+            condition = f"({column} IS NULL OR NOT {condition})"
+    return condition, params
+
+def compile_xsp_to_sql(tree, playlist_type, db_type):
+    """Translate a smart playlist into one parameterized query that returns its items with durations joined.
+    Returns (query, params), or None when the playlist uses anything beyond the supported rule set
+    (other fields or operators, nested rules, limit, group), in which case the caller uses JSON-RPC."""
+    if playlist_type not in XSP_SQL_FIELDS or tree.find('limit') is not None or tree.find('group') is not None:
+        return None
+    rules = tree.findall('rule')
+    if len(rules) != len(tree.findall('.//rule')):
+        return None
+    conditions = []
+    params = []
+    for rule in rules:
+        compiled = compile_xsp_rule(rule, playlist_type, db_type)
+        if compiled is None:
+            virtu_log(f"Smart playlist rule {rule.get('field')}/{rule.get('operator')} not supported by the SQL compiler", virtu_logDEBUG)
+            return None
+        conditions.append(compiled[0])
+        params.extend(compiled[1])
+    match_elem = tree.find('match')
+    combinator = ' OR ' if match_elem is not None and match_elem.text == 'one' else ' AND '
+    query = XSP_SQL_SELECT[playlist_type].format(int_type='SIGNED' if db_type == 'mysql' else 'INTEGER')
+    if conditions:
+        query += f" WHERE {combinator.join(conditions)}"
+    order_elem = tree.find('order')
+    order = order_elem.text if order_elem is not None and order_elem.text else 'none'
+    if order not in ('none', 'random'):
+        columns = XSP_SQL_ORDERS[playlist_type].get(order)
+        if columns is None:
+            return None
+        direction = 'DESC' if order_elem.get('direction') == 'descending' else 'ASC'
+        query += ' ORDER BY ' + ', '.join(f"{column} {direction}" for column in columns)
+    return query, params
+
+def get_sql_playlist_items(tree, playlist_path, playlist_type, log_file):
+    """Resolve a smart playlist straight from the video database when compile_xsp_to_sql supports it.
+    Returns items shaped like the Files.GetDirectory ones, or None to fall back to JSON-RPC.
+    Items without a duration are listed in log_file unless it is None."""
+    conn, cursor, db_type, _ = get_database_connection()
+    if conn is None or cursor is None:
+        return None
+    compiled = compile_xsp_to_sql(tree, playlist_type, db_type)
+    if compiled is None:
+        virtu_log(f"Smart playlist {playlist_path} not supported by the SQL compiler, using JSON-RPC", virtu_logDEBUG)
+        return None
+    query, params = compiled
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+    except Exception as e:
+        virtu_log(f"SQL resolution of {playlist_path} failed, using JSON-RPC: {str(e)}", virtu_logWARNING)
+        return None
+    finally:
+        cursor.close()
+    items = []
+    seen = set()
+    skipped_entries = []
+    for dbid, path, filename, title, showtitle, season, episode, stream_duration, runtime, studio in rows:
+        if dbid in seen:
+            continue
+        seen.add(dbid)
+        file_path = (filename if '://' in filename else path + filename).replace('\\', '/')
+        duration = 0
+        for value in (stream_duration, runtime):
+            try:
+                duration = int(value or 0)
+            except (TypeError, ValueError):
+                duration = 0
+            if duration > 0:
+                break
+        if duration <= 0:
+            skipped_entries.append(f"{playlist_type.upper()} SKIPPED: Title='{title}', File='{file_path}', Reason='Missing or invalid duration in database'\n")
+            continue
+        items.append({
+            'title': title or os.path.basename(file_path),
+            'file': file_path,
+            'season': season if playlist_type == 'episodes' and season is not None else -1,
+            'episode': episode if playlist_type == 'episodes' and episode is not None else -1,
+            'studio': [name.strip() for name in studio.split('/')] if studio else [],
+            'showtitle': showtitle or '' if playlist_type == 'episodes' else '',
+            'dbid': dbid,
+            'duration': duration
+        })
+    if skipped_entries and log_file:
+        with xbmcvfs.File(log_file, 'a') as f:
+            f.write(''.join(skipped_entries))
+    virtu_log(f"Resolved {len(items)} {playlist_type} for {playlist_path} with one SQL query ({len(skipped_entries)} without duration)", virtu_logINFO)
+    return items
+
+EPISODE_RANGE_PATTERN = re.compile(r'S(\d{2})E(\d{2})-?E?(\d{2})?', re.IGNORECASE)
+
+def set_episode_spans(items, playlist_type):
+    """Store on each item how many episodes its file covers as 'span', so scheduling can step over them.
+    Takes the larger of an SxxEyy-Ezz range in the file name and the number of library episodes
+    sharing the file, which is how Kodi lists multi-episode files."""
+    if playlist_type != 'episodes':
+        for item in items:
+            item['span'] = 1
+        return items
+    episodes_per_file = {}
+    for item in items:
+        episodes_per_file[item['file']] = episodes_per_file.get(item['file'], 0) + 1
+    for item in items:
+        span = episodes_per_file[item['file']]
+        match = EPISODE_RANGE_PATTERN.search(os.path.basename(item['file']))
+        if match and match.group(3):
+            span = max(span, int(match.group(3)) - int(match.group(2)) + 1)
+        item['span'] = span
+    return items
+
+def get_playlist_items_with_durations(playlist_path, playlist_type, source='playlist', quiet=False, lookup_cache=None):
+    """Items of a folder or smart playlist that have durations, as (items, rule_order, is_random).
+    Items skipped for lack of a duration go to missing_durations.log and failures are shown in a dialog,
+    unless quiet is set, as it is for dry runs. lookup_cache is passed on to get_durations_bulk."""
+    def show_error(message):
+        if not quiet:
+            xbmcgui.Dialog().ok("Error", message)
     if playlist_type not in ['episodes', 'movies']:
         virtu_log(f"Invalid playlist_type '{playlist_type}' for {playlist_path}", virtu_logERROR)
-        xbmcgui.Dialog().ok("Error", f"Invalid playlist type '{playlist_type}'. Must be 'episodes' or 'movies'.")
+        show_error(f"Invalid playlist type '{playlist_type}'. Must be 'episodes' or 'movies'.")
         return [], [], False
     log_dir = xbmcvfs.translatePath("special://profile/addon_data/plugin.video.virtuatv/")
     log_file = os.path.join(log_dir, "missing_durations.log")
-    if not xbmcvfs.exists(log_dir):
+    if not quiet and not xbmcvfs.exists(log_dir):
         xbmcvfs.mkdirs(log_dir)
     rule_order = []
     is_random = False
@@ -1706,7 +1978,7 @@ def get_playlist_items_with_durations(playlist_path, playlist_type, source='play
                     durations = data.get('durations', {})
             except Exception as e:
                 virtu_log(f"Error loading durations from {durations_file}: {str(e)}", virtu_logERROR)
-                xbmcgui.Dialog().ok("Error", f"Failed to load durations: {str(e)}")
+                show_error(f"Failed to load durations: {str(e)}")
                 return [], [], False
         video_extensions = ('.mp4', '.mkv', '.avi', '.m4v', '.ts', '.mov')
         video_files = []
@@ -1724,18 +1996,18 @@ def get_playlist_items_with_durations(playlist_path, playlist_type, source='play
                 video_files.extend(sub_files)
         except Exception as e:
             virtu_log(f"Error listing files in folder {playlist_path}: {str(e)}", virtu_logERROR)
-            xbmcgui.Dialog().ok("Error", f"Failed to list files in folder {playlist_path}: {str(e)}")
+            show_error(f"Failed to list files in folder {playlist_path}: {str(e)}")
             return [], [], False
         if not video_files:
             virtu_log(f"No video files found in folder {playlist_path}", virtu_logERROR)
-            xbmcgui.Dialog().ok("Error", f"No video files found in folder {playlist_path}.")
+            show_error(f"No video files found in folder {playlist_path}.")
             return [], [], False
         for file in video_files:
             duration = durations.get(file, 0)
             if duration <= 0:
-                log_entry = f"{playlist_type.upper()} SKIPPED: File='{file}', Reason='Missing or invalid duration'\n"
-                with xbmcvfs.File(log_file, 'a') as f:
-                    f.write(log_entry)
+                if not quiet:
+                    with xbmcvfs.File(log_file, 'a') as f:
+                        f.write(f"{playlist_type.upper()} SKIPPED: File='{file}', Reason='Missing or invalid duration'\n")
                 virtu_log(f"Skipped {file} due to missing/invalid duration", virtu_logWARNING)
                 continue
             item_dict = {
@@ -1751,49 +2023,42 @@ def get_playlist_items_with_durations(playlist_path, playlist_type, source='play
             virtu_log(f"Added folder item {file} with duration {duration} seconds", virtu_logDEBUG)
         if not items:
             virtu_log(f"No valid items with durations found in folder {playlist_path}", virtu_logERROR)
-            xbmcgui.Dialog().ok("Error", f"No valid video files with durations found in folder {playlist_path}. Check missing_durations.log for details.")
+            show_error(f"No valid video files with durations found in folder {playlist_path}. Check missing_durations.log for details.")
             return [], [], False
         virtu_log(f"Finalized {len(items)} valid items for folder {playlist_path}", virtu_logINFO)
-        return items, rule_order, is_random
+        return set_episode_spans(items, playlist_type), rule_order, is_random
     # Smart Playlist handling
     try:
-        playlist_path = xbmcvfs.translatePath(playlist_path).replace('\\', '/')
-        if not playlist_path.startswith('special://'):
-            playlist_path = f"special://profile/playlists/video/{os.path.basename(playlist_path)}"
+        playlist_path = normalize_playlist_path(playlist_path)
         virtu_log(f"Normalized playlist path: {playlist_path}", virtu_logDEBUG)
         if not xbmcvfs.exists(playlist_path):
-            xbmcgui.Dialog().ok("Error", f"Playlist file {playlist_path} does not exist. Ensure it is in special://profile/playlists/video/.")
+            show_error(f"Playlist file {playlist_path} does not exist. Ensure it is in special://profile/playlists/video/.")
             virtu_log(f"Playlist file {playlist_path} not found", virtu_logERROR)
             return [], rule_order, is_random
-        with xbmcvfs.File(playlist_path, 'r') as f:
-            xml_content = f.read()
-        tree = ET.fromstring(xml_content)
-        xsp_type = tree.attrib.get('type')
-        order_element = tree.find('.//order')
-        if order_element is not None and order_element.text == 'random':
+        smart_playlist = load_smart_playlist(playlist_path)
+        tree = smart_playlist.tree
+        xsp_type = smart_playlist.type
+        if smart_playlist.is_random:
             is_random = True
             virtu_log(f"Detected random order for playlist {playlist_path}", virtu_logINFO)
         else:
             virtu_log(f"No random order detected for playlist {playlist_path}, using default order", virtu_logDEBUG)
-        for smartplaylist in tree.findall('.//smartplaylist'):
-            for rule in smartplaylist.findall('.//rule'):
-                if rule.get('field') in ['title', 'tvshow', 'studio']:
-                    value = rule.find('value').text if rule.find('value') is not None else rule.text
-                    if value and isinstance(value, str):
-                        if rule.get('field') == 'tvshow' and playlist_type == 'episodes':
-                            rule_order.append(value)
-                        elif rule.get('field') == 'title' and playlist_type == 'movies':
-                            rule_order.append(value)
-                        elif rule.get('field') == 'studio' and value not in rule_order:
-                            rule_order.append(value)
+        rule_order = list(smart_playlist.rule_order.get(playlist_type, []))
         if xsp_type != playlist_type:
-            xbmcgui.Dialog().ok("Error", f"Playlist {playlist_path} type '{xsp_type}' does not match specified type '{playlist_type}'.")
+            show_error(f"Playlist {playlist_path} type '{xsp_type}' does not match specified type '{playlist_type}'.")
             virtu_log(f"Playlist type mismatch: .xsp type '{xsp_type}' vs specified '{playlist_type}'", virtu_logERROR)
             return [], rule_order, is_random
     except Exception as e:
         virtu_log(f"Error loading or parsing playlist {playlist_path}: {str(e)}", virtu_logERROR)
-        xbmcgui.Dialog().ok("Error", f"Failed to load or parse playlist {playlist_path}: {str(e)}")
+        show_error(f"Failed to load or parse playlist {playlist_path}: {str(e)}")
         return [], rule_order, is_random
+    items = get_sql_playlist_items(tree, playlist_path, playlist_type, None if quiet else log_file)
+    if items:
+        if is_random and playlist_type == 'episodes':
+            random.shuffle(items)
+            virtu_log(f"Randomized {len(items)} episodes for playlist {playlist_path}", virtu_logINFO)
+        virtu_log(f"Finalized {len(items)} valid items for {playlist_path}", virtu_logINFO)
+        return set_episode_spans(items, playlist_type), rule_order, is_random
     virtu_log(f"Resolving {playlist_path} via Files.GetDirectory", virtu_logDEBUG)
     json_query = {
         "jsonrpc": "2.0",
@@ -1801,14 +2066,14 @@ def get_playlist_items_with_durations(playlist_path, playlist_type, source='play
         "params": {
             "directory": playlist_path,
             "media": "video",
-            "properties": ["file", "title", "runtime", "showtitle", "season", "episode", "genre", "year", "director", "playcount", "rating", "studio"]
+            "properties": ["file", "title", "runtime", "streamdetails", "showtitle", "season", "episode", "studio"]
         },
         "id": 1
     }
     try:
         result = json.loads(xbmc.executeJSONRPC(json.dumps(json_query)))
         if "result" not in result or "files" not in result["result"]:
-            xbmcgui.Dialog().ok("Error", f"No {'movie' if playlist_type == 'movies' else 'TV show'} items found in {playlist_path}. Ensure the playlist is valid and media is indexed in the Kodi library.")
+            show_error(f"No {'movie' if playlist_type == 'movies' else 'TV show'} items found in {playlist_path}. Ensure the playlist is valid and media is indexed in the Kodi library.")
             virtu_log(f"No items found via Files.GetDirectory for {playlist_path}: {result.get('error', 'No result')}", virtu_logERROR)
             return [], rule_order, is_random
         files = result["result"]["files"]
@@ -1824,97 +2089,347 @@ def get_playlist_items_with_durations(playlist_path, playlist_type, source='play
                     'studio': item.get('studio', []),
                     'showtitle': item.get('showtitle', '') if playlist_type == 'episodes' else ''
                 }
+                if item.get('id') is not None:
+                    item_dict['dbid'] = item['id']
+                duration = get_jsonrpc_duration(item)
+                if duration > 0:
+                    item_dict['duration'] = duration
                 items.append(item_dict)
         virtu_log(f"Retrieved {len(items)} {'movies' if playlist_type == 'movies' else 'episodes'} via Files.GetDirectory for {playlist_path}", virtu_logINFO)
     except Exception as e:
         virtu_log(f"Files.GetDirectory error for {playlist_path}: {str(e)}", virtu_logERROR)
-        xbmcgui.Dialog().ok("Error", f"Failed to resolve playlist {playlist_path}: {str(e)}. Ensure the playlist is valid and media is indexed in the Kodi library.")
+        show_error(f"Failed to resolve playlist {playlist_path}: {str(e)}. Ensure the playlist is valid and media is indexed in the Kodi library.")
         return [], rule_order, is_random
     if not items:
-        xbmcgui.Dialog().ok("Error", f"No {'movie' if playlist_type == 'movies' else 'TV show'} items found in {playlist_path}. Check missing_durations.log for details.")
+        show_error(f"No {'movie' if playlist_type == 'movies' else 'TV show'} items found in {playlist_path}. Check missing_durations.log for details.")
         virtu_log(f"No {'movies' if playlist_type == 'movies' else 'episodes'} found for {playlist_path}", virtu_logERROR)
         return [], rule_order, is_random
     if is_random and playlist_type == 'episodes':
         random.shuffle(items)
         virtu_log(f"Randomized {len(items)} episodes for playlist {playlist_path}", virtu_logINFO)
-    conn, cursor, db_type, db_version = get_database_connection()
-    if conn is None or cursor is None:
-        virtu_log(f"Failed to connect to database for {playlist_path}", virtu_logERROR)
-        return [], rule_order, is_random
-    final_items = []
-    for item in items:
-        filename = os.path.basename(item['file'])
-        path = os.path.dirname(item['file']) + '/'
-        try:
-            if db_type == 'mysql':
-                query = (
-                    """
-                    SELECT streamdetails.iVideoDuration, tvshow.c12
-                    FROM streamdetails
-                    JOIN files ON streamdetails.idFile = files.idFile
-                    JOIN path ON files.idPath = path.idPath
-                    JOIN episode ON files.idFile = episode.idFile
-                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                    WHERE files.strFilename = %s AND path.strPath = %s AND streamdetails.iStreamType = 0
-                    LIMIT 1
-                    """ if playlist_type == 'episodes' else """
-                    SELECT streamdetails.iVideoDuration, movie.c12
-                    FROM streamdetails
-                    JOIN files ON streamdetails.idFile = files.idFile
-                    JOIN path ON files.idPath = path.idPath
-                    JOIN movie ON files.idFile = movie.idFile
-                    WHERE files.strFilename = %s AND path.strPath = %s AND streamdetails.iStreamType = 0
-                    LIMIT 1
-                    """
-                )
-                params = (filename, path)
-            else:  # sqlite
-                query = (
-                    """
-                    SELECT streamdetails.iVideoDuration, tvshow.c12
-                    FROM streamdetails
-                    JOIN files ON streamdetails.idFile = files.idFile
-                    JOIN path ON files.idPath = path.idPath
-                    JOIN episode ON files.idFile = episode.idFile
-                    JOIN tvshow ON episode.idShow = tvshow.idShow
-                    WHERE files.strFilename = ? AND path.strPath = ? AND streamdetails.iStreamType = 0
-                    LIMIT 1
-                    """ if playlist_type == 'episodes' else """
-                    SELECT streamdetails.iVideoDuration, movie.c12
-                    FROM streamdetails
-                    JOIN files ON streamdetails.idFile = files.idFile
-                    JOIN path ON files.idPath = path.idPath
-                    JOIN movie ON files.idFile = movie.idFile
-                    WHERE files.strFilename = ? AND path.strPath = ? AND streamdetails.iStreamType = 0
-                    LIMIT 1
-                    """
-                )
-                params = (filename, path)
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            if result and result[0] and result[0] > 0:
-                item['duration'] = int(result[0])
-                item['studio'] = result[1] if result[1] else item.get('studio', [])
-                final_items.append(item)
-                virtu_log(f"Found duration {item['duration']} seconds and studio {item['studio']} for {item['title']}", virtu_logDEBUG)
-            else:
-                log_entry = f"{playlist_type.upper()} SKIPPED: Title='{item['title']}', File='{item['file']}', Reason='Missing or invalid duration in database'\n"
-                with xbmcvfs.File(log_file, 'a') as f:
-                    f.write(log_entry)
+    final_items = [item for item in items if item.get('duration', 0) > 0]
+    lookup_items = [item for item in items if item.get('duration', 0) <= 0]
+    virtu_log(f"JSON-RPC supplied durations for {len(final_items)} of {len(items)} items in {playlist_path}", virtu_logDEBUG)
+    conn = None
+    db_error = None
+    durations = {}
+    if lookup_items:
+        conn, cursor, db_type, db_version = get_database_connection()
+        if conn is None or cursor is None:
+            db_error = 'No database connection'
+            virtu_log(f"Failed to connect to database for {playlist_path}", virtu_logERROR)
+        else:
+            try:
+                durations = get_durations_bulk(cursor, db_type, playlist_type, lookup_items, lookup_cache)
+            except Exception as e:
+                db_error = str(e)
+                virtu_log(f"Error fetching durations for {playlist_path}: {db_error}", virtu_logERROR)
+    skipped_entries = []
+    for item in lookup_items:
+        result = durations.get(item['file'])
+        if result and result[0] and result[0] > 0:
+            item['duration'] = int(result[0])
+            item['studio'] = [name.strip() for name in result[1].split('/')] if result[1] else item.get('studio', [])
+            final_items.append(item)
+            virtu_log(f"Found duration {item['duration']} seconds and studio {item['studio']} for {item['title']}", virtu_logDEBUG)
+        else:
+            reason = f"Database error: {db_error}" if db_error else 'Missing or invalid duration in database'
+            skipped_entries.append(f"{playlist_type.upper()} SKIPPED: Title='{item['title']}', File='{item['file']}', Reason='{reason}'\n")
+            if not db_error:
                 virtu_log(f"Skipped {item['title']} due to missing/invalid duration in database for {playlist_path}", virtu_logWARNING)
-        except Exception as e:
-            log_entry = f"{playlist_type.upper()} SKIPPED: Title='{item['title']}', File='{item['file']}', Reason='Database error: {str(e)}'\n"
-            with xbmcvfs.File(log_file, 'a') as f:
-                f.write(log_entry)
-            virtu_log(f"Error fetching duration for {item['title']} in {playlist_path}: {str(e)}", virtu_logERROR)
+    if skipped_entries and not quiet:
+        with xbmcvfs.File(log_file, 'a') as f:
+            f.write(''.join(skipped_entries))
+    if lookup_items:
+        # Keep the Files.GetDirectory order, which the random shuffle above relies on
+        order = {item['file']: idx for idx, item in enumerate(items)}
+        final_items.sort(key=lambda item: order[item['file']])
     if conn:
         conn.close()
     if not final_items:
-        xbmcgui.Dialog().ok("Error", f"No valid {'movie' if playlist_type == 'movies' else 'TV show'} items with durations found in {playlist_path}. Check missing_durations.log for details.")
+        show_error(f"No valid {'movie' if playlist_type == 'movies' else 'TV show'} items with durations found in {playlist_path}. Check missing_durations.log for details.")
         virtu_log(f"No valid {'movies' if playlist_type == 'movies' else 'episodes'} with durations found for {playlist_path}", virtu_logERROR)
         return [], rule_order, is_random
     virtu_log(f"Finalized {len(final_items)} valid items for {playlist_path}", virtu_logINFO)
-    return final_items, rule_order, is_random
+    return set_episode_spans(final_items, playlist_type), rule_order, is_random
+
+PLAYLIST_CACHE_DIR = os.path.join(SETTINGS_DIR, 'playlist_cache')
+PLAYLIST_CACHE_VERSION = 2
+PLAYLIST_CACHE_LOCK = threading.Lock()  # Pooled channel builds can resolve the same playlist at once
+LAST_LIBRARY_FINGERPRINT = None
+
+def get_library_fingerprint(cursor=None):
+    """Cheap library revision marker that changes whenever files are added, removed or rescanned.
+    Uses the files table when a database cursor is available, else VideoLibrary counts over JSON-RPC.
+    Play state is left out, since every playback would change it; LibraryMonitor drops the cache
+    entries whose rules depend on it instead."""
+    global LAST_LIBRARY_FINGERPRINT
+    fingerprint = None
+    if cursor is not None:
+        try:
+            cursor.execute("SELECT MAX(idFile), MAX(dateAdded), COUNT(*) FROM files")
+            row = cursor.fetchone()
+            fingerprint = f"db:{row[0]}:{row[1]}:{row[2]}"
+        except Exception as e:
+            virtu_log(f"Error reading library fingerprint from database: {str(e)}", virtu_logWARNING)
+    if fingerprint is None:
+        try:
+            parts = []
+            for method, key, id_key in (('VideoLibrary.GetEpisodes', 'episodes', 'episodeid'), ('VideoLibrary.GetMovies', 'movies', 'movieid')):
+                json_query = {
+                    "jsonrpc": "2.0",
+                    "method": method,
+                    "params": {
+                        "properties": ["dateadded"],
+                        "sort": {"method": "dateadded", "order": "descending"},
+                        "limits": {"start": 0, "end": 1}
+                    },
+                    "id": 1
+                }
+                result = json.loads(xbmc.executeJSONRPC(json.dumps(json_query))).get('result', {})
+                latest = (result.get(key) or [{}])[0]
+                parts.append(f"{result.get('limits', {}).get('total', 0)}:{latest.get(id_key, '')}:{latest.get('dateadded', '')}")
+            fingerprint = 'rpc:' + ':'.join(parts)
+        except Exception as e:
+            virtu_log(f"Error reading library fingerprint via JSON-RPC: {str(e)}", virtu_logWARNING)
+            return None
+    if fingerprint != LAST_LIBRARY_FINGERPRINT:
+        if LAST_LIBRARY_FINGERPRINT is not None:
+            virtu_log(f"Library changed ({LAST_LIBRARY_FINGERPRINT} -> {fingerprint})", virtu_logINFO)
+        LAST_LIBRARY_FINGERPRINT = fingerprint
+    return fingerprint
+
+def get_playlist_cache_file(playlist_path, playlist_type):
+    """Cache file holding the resolved items of one smart playlist."""
+    key = hashlib.sha1(f"{playlist_type}|{playlist_path}".encode('utf-8')).hexdigest()
+    return os.path.join(PLAYLIST_CACHE_DIR, f"{key}.json")
+
+def load_playlist_cache(playlist_path, playlist_type):
+    """Return the cached entry for a playlist, or None if missing or unreadable."""
+    cache_file = get_playlist_cache_file(playlist_path, playlist_type)
+    if not xbmcvfs.exists(cache_file):
+        return None
+    try:
+        with xbmcvfs.File(cache_file, 'r') as f:
+            entry = json.loads(f.read())
+        return entry if entry.get('version') == PLAYLIST_CACHE_VERSION else None
+    except Exception as e:
+        virtu_log(f"Error reading playlist cache {cache_file}: {str(e)}", virtu_logWARNING)
+        return None
+
+def save_playlist_cache(playlist_path, playlist_type, entry):
+    """Write a playlist cache entry, logging instead of failing the channel build."""
+    cache_file = get_playlist_cache_file(playlist_path, playlist_type)
+    try:
+        if not xbmcvfs.exists(PLAYLIST_CACHE_DIR):
+            xbmcvfs.mkdirs(PLAYLIST_CACHE_DIR)
+        entry['version'] = PLAYLIST_CACHE_VERSION
+        entry['path'] = playlist_path
+        entry['type'] = playlist_type
+        with PLAYLIST_CACHE_LOCK, xbmcvfs.File(cache_file, 'w') as f:
+            f.write(json.dumps(entry))
+        virtu_log(f"Saved {len(entry.get('items', []))} resolved items for {playlist_path} to playlist cache", virtu_logDEBUG)
+    except Exception as e:
+        virtu_log(f"Error writing playlist cache {cache_file}: {str(e)}", virtu_logWARNING)
+
+def get_xsp_rule_summary(smart_playlist):
+    """Rule fields used by a smart playlist and the tvshow names it is limited to (None if unrestricted)."""
+    rules = smart_playlist.rules
+    rule_fields = sorted({rule.get('field', '') for rule in rules})
+    show_rules = [rule for rule in rules if rule.get('field') == 'tvshow' and rule.get('operator') == 'is']
+    # With <match>one</match> any non-tvshow rule can pull in episodes of other shows
+    if not show_rules or (smart_playlist.match == 'one' and len(show_rules) != len(rules)):
+        return rule_fields, None
+    show_filter = set()
+    for rule in show_rules:
+        values = [value.text for value in rule.findall('value') if value.text] or ([rule.text] if rule.text else [])
+        show_filter.update(values)
+    return rule_fields, sorted(show_filter)
+
+def resolve_playlist(playlist_path, playlist_type, cursor=None, db_type=None, fingerprint=None, dry_run=False, lookup_cache=None):
+    """Smart playlist items with durations and show/movie metadata, served from the playlist cache
+    while both the .xsp content and the library fingerprint are unchanged. A fresh resolution is
+    written back to the cache, except in a dry_run, which also logs and shows nothing. Library lookups
+    are memoized in lookup_cache, if given.
+    Returns (items, rule_order, is_random, metadata) with metadata as {file: (name, description, genre, date)}."""
+    playlist_path = normalize_playlist_path(playlist_path)
+    smart_playlist = None
+    if fingerprint:
+        try:
+            smart_playlist = load_smart_playlist(playlist_path)
+        except Exception as e:
+            virtu_log(f"Error reading playlist {playlist_path} for playlist cache: {str(e)}", virtu_logWARNING)
+    xsp_hash = smart_playlist.hash if smart_playlist else None
+    entry = load_playlist_cache(playlist_path, playlist_type) if xsp_hash else None
+    if entry and entry.get('xsp_hash') == xsp_hash and entry.get('fingerprint') == fingerprint:
+        shows = entry.get('shows', [])
+        items = []
+        metadata = {}
+        for cached_item in entry.get('items', []):
+            item = dict(cached_item)
+            show_idx = item.pop('show', None)
+            if show_idx is not None:
+                metadata[item['file']] = tuple(shows[show_idx])
+            items.append(item)
+        is_random = entry.get('is_random', False)
+        if is_random and playlist_type == 'episodes':
+            random.shuffle(items)
+        virtu_log(f"Playlist cache hit for {playlist_path}: {len(items)} items", virtu_logINFO)
+        return items, entry.get('rule_order', []), is_random, metadata
+    items, rule_order, is_random = get_playlist_items_with_durations(playlist_path, playlist_type, source='playlist', quiet=dry_run, lookup_cache=lookup_cache)
+    if not items:
+        return items, rule_order, is_random, {}
+    metadata = get_metadata_bulk(cursor, db_type, playlist_type, items, lookup_cache) if cursor is not None else {}
+    if xsp_hash and not dry_run:
+        shows = []
+        show_index = {}
+        cached_items = []
+        for item in items:
+            cached_item = dict(item)
+            show = metadata.get(item['file'])
+            if show:
+                if show not in show_index:
+                    show_index[show] = len(shows)
+                    shows.append(list(show))
+                cached_item['show'] = show_index[show]
+            cached_items.append(cached_item)
+        rule_fields, show_filter = get_xsp_rule_summary(smart_playlist)
+        save_playlist_cache(playlist_path, playlist_type, {
+            'xsp_hash': xsp_hash,
+            'fingerprint': fingerprint,
+            'rule_fields': rule_fields,
+            'show_filter': show_filter,
+            'ids': sorted({item['dbid'] for item in items if item.get('dbid') is not None}),
+            'rule_order': rule_order,
+            'is_random': is_random,
+            'items': cached_items,
+            'shows': shows
+        })
+    return items, rule_order, is_random, metadata
+
+def get_current_library_fingerprint():
+    """Library fingerprint read over a short-lived connection, for callers outside a channel build."""
+    conn, cursor, db_type, _ = get_database_connection()
+    try:
+        return get_library_fingerprint(cursor)
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+def get_library_item_details(media_type, dbid):
+    """Title and show title of a library item over JSON-RPC, or an empty dict if it cannot be found."""
+    method, id_key, result_key, properties = {
+        'episode': ('VideoLibrary.GetEpisodeDetails', 'episodeid', 'episodedetails', ['title', 'showtitle']),
+        'movie': ('VideoLibrary.GetMovieDetails', 'movieid', 'moviedetails', ['title']),
+        'tvshow': ('VideoLibrary.GetTVShowDetails', 'tvshowid', 'tvshowdetails', ['title'])
+    }[media_type]
+    json_query = {"jsonrpc": "2.0", "method": method, "params": {id_key: dbid, "properties": properties}, "id": 1}
+    try:
+        return json.loads(xbmc.executeJSONRPC(json.dumps(json_query))).get('result', {}).get(result_key, {})
+    except Exception as e:
+        virtu_log(f"Error fetching {media_type} {dbid} details: {str(e)}", virtu_logWARNING)
+        return {}
+
+def invalidate_playlist_cache(changes, old_fingerprint, new_fingerprint):
+    """Drop cached playlist resolutions touched by library changes and re-stamp the rest.
+    changes holds (media type, id, removed, playcount_only) tuples from VideoLibrary notifications.
+    Entries stamped with old_fingerprint that no change affects move to new_fingerprint."""
+    if not xbmcvfs.exists(PLAYLIST_CACHE_DIR):
+        return 0
+    entries = {}
+    for name in xbmcvfs.listdir(PLAYLIST_CACHE_DIR)[1]:
+        if not name.endswith('.json'):
+            continue
+        cache_file = os.path.join(PLAYLIST_CACHE_DIR, name)
+        try:
+            with xbmcvfs.File(cache_file, 'r') as f:
+                entry = json.loads(f.read())
+            entry['ids'] = set(entry.get('ids', []))
+            entries[cache_file] = entry
+        except Exception as e:
+            virtu_log(f"Dropping unreadable playlist cache {cache_file}: {str(e)}", virtu_logWARNING)
+            xbmcvfs.delete(cache_file)
+    affected = set()
+    for media_type, dbid, removed, playcount_only in changes:
+        playlist_type = {'episode': 'episodes', 'tvshow': 'episodes', 'movie': 'movies'}.get(media_type)
+        if playlist_type is None or dbid is None:
+            continue
+        details = None
+        for cache_file, entry in entries.items():
+            if cache_file in affected or entry.get('type') != playlist_type:
+                continue
+            if playcount_only and not {'playcount', 'lastplayed'} & set(entry.get('rule_fields', [])):
+                continue
+            if media_type != 'tvshow' and dbid in entry['ids']:
+                affected.add(cache_file)
+                continue
+            if removed:
+                continue
+            # An item the entry does not hold yet, or a show edit: only a show rule can rule it out
+            show_filter = entry.get('show_filter')
+            if show_filter is None or media_type == 'movie':
+                affected.add(cache_file)
+                continue
+            if details is None:
+                details = get_library_item_details(media_type, dbid)
+            show_title = details.get('showtitle') if media_type == 'episode' else details.get('title')
+            if not show_title or show_title in show_filter:
+                affected.add(cache_file)
+    for cache_file, entry in entries.items():
+        if cache_file in affected:
+            xbmcvfs.delete(cache_file)
+            virtu_log(f"Invalidated playlist cache for {entry.get('path')} after library change", virtu_logINFO)
+        elif new_fingerprint and old_fingerprint != new_fingerprint and entry.get('fingerprint') == old_fingerprint:
+            entry['fingerprint'] = new_fingerprint
+            entry['ids'] = sorted(entry['ids'])
+            save_playlist_cache(entry.get('path'), entry.get('type'), entry)
+    virtu_log(f"Library changes invalidated {len(affected)} of {len(entries)} cached playlists", virtu_logINFO)
+    return len(affected)
+
+class LibraryMonitor(xbmc.Monitor):
+    """Invalidates only the cached playlist resolutions that VideoLibrary notifications touch."""
+    def __init__(self):
+        super(LibraryMonitor, self).__init__()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.scanning = False
+        self.fingerprint = get_current_library_fingerprint()
+        release_database_connections()
+    def onNotification(self, sender, method, data):
+        if method == 'VideoLibrary.OnScanStarted':
+            self.scanning = True
+            return
+        if method not in ('VideoLibrary.OnUpdate', 'VideoLibrary.OnRemove', 'VideoLibrary.OnScanFinished', 'VideoLibrary.OnCleanFinished'):
+            return
+        try:
+            payload = json.loads(data) if data else {}
+        except ValueError:
+            payload = {}
+        if method in ('VideoLibrary.OnUpdate', 'VideoLibrary.OnRemove'):
+            item = payload.get('item', payload)
+            playcount_only = method == 'VideoLibrary.OnUpdate' and 'playcount' in payload and not payload.get('added')
+            with self.lock:
+                self.pending.append((item.get('type'), item.get('id'), method == 'VideoLibrary.OnRemove', playcount_only))
+            virtu_log(f"LibraryMonitor: {method} for {item.get('type')} {item.get('id')}", virtu_logDEBUG)
+            if self.scanning:
+                return
+        else:
+            self.scanning = False
+        self.process_pending()
+    def process_pending(self):
+        with self.lock:
+            changes, self.pending = self.pending, []
+            if not changes:
+                return
+            try:
+                new_fingerprint = get_current_library_fingerprint()
+                invalidate_playlist_cache(changes, self.fingerprint, new_fingerprint)
+                self.fingerprint = new_fingerprint
+            except Exception as e:
+                virtu_log(f"LibraryMonitor: Error invalidating playlist cache: {str(e)}", virtu_logERROR)
+            finally:
+                release_database_connections()
 
 def get_interleave_values(dialog):
     """Get interleave values (low, high, count) with validation and swapping if low > high."""
@@ -2418,6 +2933,9 @@ def delete_channel():
         if xbmcvfs.exists(m3u_filename):
             xbmcvfs.delete(m3u_filename)
             virtu_log(f"VirtuaTV: Deleted M3U file {m3u_filename} for channel {channel_name} ({channel_number})", virtu_logINFO)
+        index_file = get_schedule_index_file(m3u_filename)
+        if xbmcvfs.exists(index_file):
+            xbmcvfs.delete(index_file)
         xbmcgui.Dialog().ok("Success", f"Channel {channel_name} ({channel_number}) deleted!")
         virtu_log(f"VirtuaTV: Channel {channel_number} deleted successfully", virtu_logINFO)
     except Exception as e:
@@ -2440,6 +2958,9 @@ def delete_all_channels():
             if xbmcvfs.exists(m3u_filename):
                 xbmcvfs.delete(m3u_filename)
                 virtu_log(f"VirtuaTV: Deleted M3U file {m3u_filename} for channel {channel_name} ({channel_number})", virtu_logINFO)
+            index_file = get_schedule_index_file(m3u_filename)
+            if xbmcvfs.exists(index_file):
+                xbmcvfs.delete(index_file)
         except Exception as e:
             virtu_log(f"VirtuaTV: Error deleting files for channel {channel_number}: {str(e)}", virtu_logERROR)
     channels = []
@@ -2931,51 +3452,6 @@ def restore_addon():
     else:
         dialog.ok("Error", "Failed to restore addon!")
 
-def compact_last_index(json_str):
-    lines = json_str.splitlines()
-    output = []
-    i = 0
-    in_last_index = False
-    in_list = False
-    list_buffer = []
-    key_line = None
-    has_comma = False
-    while i < len(lines):
-        line = lines[i]
-        stripped = line.strip()
-        if '"last_index": {' in stripped:
-            in_last_index = True
-        if in_last_index and '}' in stripped:
-            in_last_index = False
-        if in_list:
-            if stripped.startswith(']'):
-                compact_list = '[' + ','.join(list_buffer) + ']'
-                if stripped.endswith(','):
-                    compact_list += ','
-                    has_comma = True
-                else:
-                    has_comma = False
-                output.append(key_line.replace('[', compact_list))
-                in_list = False
-                list_buffer = []
-                key_line = None
-                i += 1
-                continue
-            else:
-                num = stripped.rstrip(',')
-                list_buffer.append(num)
-            i += 1
-            continue
-        else:
-            if in_last_index and stripped.endswith('": ['):
-                in_list = True
-                key_line = line
-                i += 1
-                continue
-            output.append(line)
-        i += 1
-    return '\n'.join(output)
-
 # Replace your existing sync_files function
 
 #import xml.dom.minidom  # Added for pretty-printing XMLTV
@@ -3000,26 +3476,33 @@ def sync_files():
                 with xbmcvfs.File(shared_channels, 'r') as f:
                     shared_content = f.read()
             if mtime_local > mtime_shared and local_content != shared_content:
-                if xbmcvfs.copy(local_channels, shared_channels):
+                # Written through a temp file so other clients never read a half-copied channels.json
+                try:
+                    with atomic_write(shared_channels) as f:
+                        f.write(local_content)
                     virtu_log("sync_files: Pushed channels.json to shared folder", virtu_logINFO)
                     files_changed = True
                     significant_change = True
-                else:
-                    virtu_log("sync_files: Failed to push channels.json", virtu_logERROR)
+                except Exception as e:
+                    virtu_log(f"sync_files: Failed to push channels.json: {str(e)}", virtu_logERROR)
                     return False
             elif mtime_shared > mtime_local and local_content != shared_content:
-                if xbmcvfs.copy(shared_channels, local_channels):
+                try:
+                    with atomic_write(local_channels) as f:
+                        f.write(shared_content)
+                    remember_channels_content(shared_content)
                     virtu_log("sync_files: Pulled channels.json from shared folder", virtu_logINFO)
                     files_changed = True
                     significant_change = True
-                else:
-                    virtu_log("sync_files: Failed to pull channels.json", virtu_logERROR)
+                except Exception as e:
+                    virtu_log(f"sync_files: Failed to pull channels.json: {str(e)}", virtu_logERROR)
                     return False
         # Combine all M3U files into VirtuaTV.m3u and generate VirtuaTV.xml
         combined_m3u = os.path.join(storage_path, 'VirtuaTV.m3u')
         combined_xmltv = os.path.join(storage_path, 'VirtuaTV.xml')
         m3u_content = ['#EXTM3U']
-        xmltv_root = ET.Element('tv', generator_info_name='VirtuaTV')
+        # XMLTV is written line by line in the vertical layout the file has always had
+        xmltv_lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<!DOCTYPE tv SYSTEM "xmltv.dtd">', '<tv generator_info_name="VirtuaTV">']
         existing_m3u_content = ''
         if xbmcvfs.exists(combined_m3u):
             with xbmcvfs.File(combined_m3u, 'r') as f:
@@ -3034,89 +3517,77 @@ def sync_files():
             channel_id = channel.get('id', f"{channel_name.replace(' ', '_')}@VirtuaTV")
             safe_channel_name = ''.join(c for c in channel_name if c.isalnum() or c in (' ', '_', '-')).replace(' ', '_')
             # Add channel to XMLTV
-            channel_elem = ET.SubElement(xmltv_root, 'channel', id=channel_id)
-            ET.SubElement(channel_elem, 'display-name').text = f"{channel_number}. {channel_name}"
+            xmltv_lines.append(f'  <channel id={quoteattr(channel_id)}>')
+            xmltv_lines.append(f'    <display-name>{escape(f"{channel_number}. {channel_name}")}</display-name>')
+            xmltv_lines.append('  </channel>')
             m3u_file = os.path.join(storage_path, f'VirtuaTV_Channel_{channel_number}_{safe_channel_name}.m3u')
             if xbmcvfs.exists(m3u_file):
-                with xbmcvfs.File(m3u_file, 'r') as f:
-                    channel_m3u_content = f.read().splitlines()
-                # Process M3U entries, adding IPTV Simple Client attributes
-                i = 0
+                schedule_index = load_schedule_index(m3u_file)
+                if schedule_index is None and channel.get('last_gen_time'):
+                    schedule_index = rebuild_schedule_index(m3u_file, datetime.datetime.fromisoformat(channel['last_gen_time']).timestamp())
+                start_position = 0
                 current_time = base_time
-                while i < len(channel_m3u_content):
-                    line = channel_m3u_content[i]
-                    if line.startswith('#EXTM3U'):
-                        i += 1
-                        continue
-                    if line.startswith('#EXTINF:'):
-                        if i + 1 < len(channel_m3u_content):
-                            duration_match = re.search(r'#EXTINF:(\d+)', line)
-                            if duration_match:
-                                duration = int(duration_match.group(1))
-                                info_parts = line.split(',', 1)[1].split('//', 2)
-                                showtitle = info_parts[0] if len(info_parts) >= 1 else channel_name
-                                title = info_parts[1] if len(info_parts) >= 2 else channel_name
-                                description = info_parts[2] if len(info_parts) >= 3 else ''
-                                # Add M3U entry with IPTV Simple Client attributes
-                                new_extinf = f'#EXTINF:{duration} tvg-id="{channel_id}" tvg-name="{channel_number}. {channel_name}" tvg-chno="{channel_number}" group-title="VirtuaTV",{channel_name}'
-                                new_m3u_content.append(new_extinf)
-                                new_m3u_content.append(channel_m3u_content[i + 1])
-                                # Add program to XMLTV without start and stop times
-                                programme_elem = ET.SubElement(xmltv_root, 'programme', channel=channel_id)
-                                ET.SubElement(programme_elem, 'title').text = title
-                                ET.SubElement(programme_elem, 'desc').text = description
-                                current_time += datetime.timedelta(seconds=duration)
-                            else:
-                                virtu_log(f"sync_files: Invalid #EXTINF format in {m3u_file}: {line}", virtu_logWARNING)
-                            i += 2
-                        else:
-                            virtu_log(f"sync_files: Incomplete #EXTINF entry in {m3u_file}: {line}", virtu_logWARNING)
-                            i += 1
-                    else:
-                        virtu_log(f"sync_files: Unexpected line in {m3u_file}: {line}", virtu_logWARNING)
-                        i += 1
+                if schedule_index:
+                    # Aired entries stay at the head of the channel M3U until compaction; only what is on
+                    # now and after it is published
+                    first = schedule_index.elapsed_count(base_time.timestamp())
+                    start_position = schedule_index.positions[first] if first < len(schedule_index) else schedule_index.m3u_size
+                    current_time = datetime.datetime.fromtimestamp(schedule_index.anchor + schedule_index.offsets[first], datetime.timezone.utc)
+                # Process M3U entries, adding IPTV Simple Client attributes
+                with xbmcvfs.File(m3u_file) as f:
+                    f.seek(start_position, 0)
+                    for entry in iter_m3u_entries(f.readBytes):
+                        if entry.path is None:
+                            virtu_log(f"sync_files: Incomplete #EXTINF entry in {m3u_file}: {entry.title}", virtu_logWARNING)
+                            continue
+                        duration = entry.duration
+                        info_parts = entry.title.split('//', 2)
+                        showtitle = info_parts[0] if len(info_parts) >= 1 else channel_name
+                        title = info_parts[1] if len(info_parts) >= 2 else channel_name
+                        description = info_parts[2] if len(info_parts) >= 3 else ''
+                        # Add M3U entry with IPTV Simple Client attributes
+                        new_extinf = f'#EXTINF:{duration} tvg-id="{channel_id}" tvg-name="{channel_number}. {channel_name}" tvg-chno="{channel_number}" group-title="VirtuaTV",{channel_name}'
+                        new_m3u_content.append(new_extinf)
+                        new_m3u_content.append(entry.path)
+                        # Add program to XMLTV, timed from the channel's schedule anchor
+                        stop_time = current_time + datetime.timedelta(seconds=duration)
+                        xmltv_lines.append(f'  <programme channel={quoteattr(channel_id)} start="{current_time.strftime("%Y%m%d%H%M%S %z")}" stop="{stop_time.strftime("%Y%m%d%H%M%S %z")}">')
+                        xmltv_lines.append(f'    <title>{escape(title)}</title>' if title else '    <title/>')
+                        xmltv_lines.append(f'    <desc>{escape(description)}</desc>' if description else '    <desc/>')
+                        xmltv_lines.append('  </programme>')
+                        current_time = stop_time
                 virtu_log(f"sync_files: Included {m3u_file} in combined M3U and XMLTV with IPTV attributes", virtu_logDEBUG)
             else:
                 virtu_log(f"sync_files: M3U file {m3u_file} not found, skipping", virtu_logWARNING)
         # Write VirtuaTV.m3u
         combined_m3u_content = '\n'.join(m3u_content + new_m3u_content) + '\n'
         if combined_m3u_content != existing_m3u_content:
-            temp_m3u = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_combined_m3u_{os.getpid()}.m3u")
-            with xbmcvfs.File(temp_m3u, 'w') as f:
-                f.write(combined_m3u_content)
-            if xbmcvfs.copy(temp_m3u, combined_m3u):
-                xbmcvfs.delete(temp_m3u)
-                virtu_log(f"sync_files: Generated combined M3U at {combined_m3u}", virtu_logINFO)
-                files_changed = True
-                significant_change = True
-            else:
-                xbmcvfs.delete(temp_m3u)
-                virtu_log(f"sync_files: Failed to generate combined M3U at {combined_m3u}", virtu_logERROR)
+            try:
+                with atomic_write(combined_m3u) as f:
+                    f.write(combined_m3u_content)
+            except Exception as e:
+                virtu_log(f"sync_files: Failed to generate combined M3U at {combined_m3u}: {str(e)}", virtu_logERROR)
                 return False
-        # Write VirtuaTV.xml with vertical formatting
-        xmltv_content = ET.tostring(xmltv_root, encoding='unicode', method='xml')
-        # Pretty-print XML for vertical formatting
-        parsed_xml = xml.dom.minidom.parseString(xmltv_content)
-        pretty_xml = parsed_xml.toprettyxml(indent="  ", encoding="UTF-8").decode("UTF-8")
-        # Remove extra blank lines
-        pretty_xml = "\n".join(line for line in pretty_xml.splitlines() if line.strip())
+            virtu_log(f"sync_files: Generated combined M3U at {combined_m3u}", virtu_logINFO)
+            files_changed = True
+            significant_change = True
+        # Write VirtuaTV.xml
+        xmltv_lines.append('</tv>')
+        xmltv_content = '\n'.join(xmltv_lines)
         existing_xmltv_content = ''
         if xbmcvfs.exists(combined_xmltv):
             with xbmcvfs.File(combined_xmltv, 'r') as f:
                 existing_xmltv_content = f.read()
-        if pretty_xml != existing_xmltv_content:
-            temp_xmltv = os.path.join(xbmcvfs.translatePath("special://temp"), f"virtuatv_xmltv_{os.getpid()}.xml")
-            with xbmcvfs.File(temp_xmltv, 'w') as f:
-                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE tv SYSTEM "xmltv.dtd">\n' + pretty_xml)
-            if xbmcvfs.copy(temp_xmltv, combined_xmltv):
-                xbmcvfs.delete(temp_xmltv)
-                virtu_log(f"sync_files: Generated XMLTV at {combined_xmltv}", virtu_logINFO)
-                files_changed = True
-                significant_change = True
-            else:
-                xbmcvfs.delete(temp_xmltv)
-                virtu_log(f"sync_files: Failed to generate XMLTV at {combined_xmltv}", virtu_logERROR)
+        if xmltv_content != existing_xmltv_content:
+            try:
+                with atomic_write(combined_xmltv) as f:
+                    f.write(xmltv_content)
+            except Exception as e:
+                virtu_log(f"sync_files: Failed to generate XMLTV at {combined_xmltv}: {str(e)}", virtu_logERROR)
                 return False
+            virtu_log(f"sync_files: Generated XMLTV at {combined_xmltv}", virtu_logINFO)
+            files_changed = True
+            significant_change = True
         # Clean up any local M3U files in addon data folder only if shared_folder is set and different from SETTINGS_DIR
         if shared_folder and storage_path != SETTINGS_DIR:
             for channel in channels:
@@ -3147,13 +3618,11 @@ def regenerate_channels():
     time.sleep(0.1)
     total_channels = len(channels)
     successful = 0
-    for idx, channel in enumerate(channels):
+    results = build_channels_parallel(channels, [channel.get('number', -1) for channel in channels], generate_channel_files)
+    for channel in channels:
         channel_name = channel.get('name', 'Unknown')
         channel_number = channel.get('number', -1)
-        dialog.notification("VirtuaTV", f"Regenerating channel {channel_name} ({channel_number})...", xbmcgui.NOTIFICATION_INFO, 1500)
-        virtu_log(f"Regenerating channel {channel_name} ({channel_number})", virtu_logINFO)
-        time.sleep(0.1)
-        if generate_channel_files(channel_number):
+        if results.get(channel_number):
             successful += 1
         else:
             virtu_log(f"Failed to regenerate channel {channel_name} ({channel_number})", virtu_logERROR)
@@ -3165,8 +3634,123 @@ def regenerate_channels():
     else:
         dialog.notification("VirtuaTV", f"Regeneration complete: {successful}/{total_channels} channels successful, but failed to sync files!", xbmcgui.NOTIFICATION_WARNING, 3000)
         virtu_log(f"Regeneration complete: {successful}/{total_channels} channels successful, but file sync failed", virtu_logWARNING)
+    release_database_connections()
     time.sleep(0.1)
 
+class CountingWriter:
+    """File-like sink that only counts the characters written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+def simulate_pass(channel, days, report):
+    """One dry-run build of channel, recording its phases, entry counts, rotation and warnings in report."""
+    started = time.perf_counter()
+    all_playlists = build_channel_playlists(channel, None, report['playlist_timings'], dry_run=True)
+    report['phases']['resolve'] = time.perf_counter() - started
+    if not all_playlists:
+        report['error'] = "No valid playlists"
+        return
+    engine = ScheduleEngine(all_playlists, 'time', int(days * 86400))
+    schedule_time = 0
+    def timed_entries():
+        # Scheduling and formatting interleave, so the time spent inside the engine is summed apart
+        nonlocal schedule_time
+        entries = engine.entries()
+        while True:
+            started = time.perf_counter()
+            entry = next(entries, None)
+            schedule_time += time.perf_counter() - started
+            if entry is None:
+                return
+            yield entry
+    started = time.perf_counter()
+    sink = CountingWriter()
+    written, duration = write_m3u_entries(sink, timed_entries(), all_playlists[0], report['name'])
+    report['phases']['schedule'] = schedule_time
+    report['phases']['format'] = time.perf_counter() - started - schedule_time
+    report['entries'] = written
+    report['cycles'] = engine.cycle_count
+    report['duration'] = duration
+    report['m3u_size'] = sink.size
+    report['warnings'] = engine.warnings
+    for playlist_idx, playlist in enumerate(all_playlists):
+        for item_name, group_size in engine.item_counts[playlist_idx].items():
+            if group_size:
+                report['rotation'].append((playlist['path'], item_name, group_size, engine.episodes_taken[playlist_idx].get(item_name, 0) / group_size))
+    report['rotation'].sort(key=lambda row: row[3], reverse=True)
+
+def simulate_channel(channel, days):
+    """Dry-run the full schedule build of one channel for the given number of days.
+
+    Works on copies of the channel and streams the M3U into a CountingWriter exactly as a real build
+    writes it, so neither the M3U files, channels.json nor the playlist cache are touched. Returns a report
+    dict with per-phase and per-playlist timings, entry counts, the tracemalloc peak and how often each
+    group rotated within the horizon. Tracing slows every allocation, so the timings come from an untraced
+    pass and the peak from a second, traced one.
+    """
+    report = {
+        'number': channel.get('number', -1), 'name': channel.get('name', 'Unknown'), 'days': days,
+        'phases': {}, 'playlist_timings': {}, 'entries': 0, 'cycles': 0, 'duration': 0,
+        'm3u_size': 0, 'peak_memory': 0, 'rotation': [], 'warnings': [], 'error': None,
+    }
+    try:
+        simulate_pass(copy.deepcopy(channel), days, report)
+        if report['error'] is None:
+            tracemalloc.start()
+            try:
+                simulate_pass(copy.deepcopy(channel), days, dict(report, phases={}, playlist_timings={}, rotation=[]))
+                report['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        virtu_log(f"Simulation failed for channel {report['name']}: {str(e)}\n{traceback.format_exc()}", virtu_logERROR)
+        report['error'] = str(e)
+    finally:
+        release_database_connections()
+    return report
+
+def simulate_channels(channel_numbers=None, days=None):
+    """Run simulate_channel for the given channels (all when None) and return their reports."""
+    if days is None:
+        days = int(ADDON.getSetting('max_playlist_duration') or 24) / 24
+    channels = load_channels(save_migrations=False)
+    return [simulate_channel(channel, days) for channel in channels if channel_numbers is None or channel['number'] in channel_numbers]
+
+def format_simulation_report(reports):
+    lines = []
+    for report in reports:
+        lines.append(f"[B]Channel {report['number']}: {report['name']}[/B] ({report['days']:g} days)")
+        if report['error']:
+            lines.append(f"  Failed: {report['error']}")
+        phases = ', '.join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in report['phases'].items())
+        lines.append(f"  Phases: {phases}")
+        for path, seconds in sorted(report['playlist_timings'].items(), key=lambda row: row[1], reverse=True):
+            lines.append(f"  Playlist {path}: {seconds * 1000:.1f} ms")
+        lines.append(f"  Entries: {report['entries']} in {report['cycles']} cycles, {report['duration'] / 3600:.1f} hours, M3U {report['m3u_size'] / 1024:.0f} KB")
+        lines.append(f"  Peak memory: {report['peak_memory'] / 1048576:.1f} MB")
+        for path, item_name, group_size, rotations in report['rotation']:
+            lines.append(f"  {os.path.basename(path)} / {item_name}: {group_size} items, {rotations:.2f} rotations")
+        for warning in report['warnings']:
+            lines.append(f"  Warning: {warning}")
+        lines.append('')
+    return '\n'.join(lines)
+
+def simulate(params):
+    """Plugin route: ?action=simulate[&channel=N][&days=D] shows a dry-run timing report."""
+    channel_numbers = [int(params['channel'])] if params.get('channel') else None
+    days = float(params['days']) if params.get('days') else None
+    reports = simulate_channels(channel_numbers, days)
+    if not reports:
+        xbmcgui.Dialog().ok("VirtuaTV", "No channels to simulate.")
+        return
+    text = format_simulation_report(reports)
+    virtu_log(f"Simulation report:\n{text}", virtu_logINFO)
+    xbmcgui.Dialog().textviewer("VirtuaTV Simulation", text)
+
 def auto_regen_loop():
     """
     Periodically checks if channels need replenishment based on auto_regen_interval and auto_regen_threshold.
@@ -3252,6 +3836,7 @@ def auto_regen_loop():
             threshold_sec = int(ADDON.getSetting('auto_regen_threshold') or 12) * 3600
             successful = 0
             total_channels = len(channels)
+            due = []
             for channel in channels:
                 channel_name = channel.get('name', 'Unknown')
                 channel_number = channel.get('number', -1)
@@ -3263,22 +3848,20 @@ def auto_regen_loop():
                         virtu_log(f"auto_regen_loop: Channel {channel_name} (number {channel_number}): time_left={time_left}, threshold={threshold_sec}, is_new={channel.get('is_new', False)}", virtu_logDEBUG)
                         if time_left < threshold_sec or channel.get('is_new', False):
                             virtu_log(f"auto_regen_loop: Replenishing channel {channel_name} (time_left={time_left} < {threshold_sec} or is_new={channel.get('is_new', False)})", virtu_logINFO)
-                            if update_channel_files(channel_number):
-                                successful += 1
-                                virtu_log(f"auto_regen_loop: Successfully replenished channel {channel_name} ({channel_number})", virtu_logINFO)
-                            else:
-                                virtu_log(f"auto_regen_loop: Failed to replenish channel {channel_name} ({channel_number})", virtu_logERROR)
+                            due.append(channel_number)
                         else:
                             virtu_log(f"auto_regen_loop: Channel {channel_name} does not need replenishment (time_left={time_left} >= {threshold_sec})", virtu_logDEBUG)
                     else:
                         virtu_log(f"auto_regen_loop: Channel {channel_name} missing last_gen_time or total_gen_duration, forcing replenishment", virtu_logWARNING)
-                        if update_channel_files(channel_number):
-                            successful += 1
-                            virtu_log(f"auto_regen_loop: Successfully replenished channel {channel_name} ({channel_number})", virtu_logINFO)
-                        else:
-                            virtu_log(f"auto_regen_loop: Failed to replenish channel {channel_name} ({channel_number})", virtu_logERROR)
+                        due.append(channel_number)
                 except Exception as e:
                     virtu_log(f"auto_regen_loop: Error processing channel {channel_name}: {str(e)}", virtu_logERROR)
+            for channel_number, success in build_channels_parallel(channels, due, update_channel_files).items():
+                if success:
+                    successful += 1
+                    virtu_log(f"auto_regen_loop: Successfully replenished channel {channel_number}", virtu_logINFO)
+                else:
+                    virtu_log(f"auto_regen_loop: Failed to replenish channel {channel_number}", virtu_logERROR)
             if successful > 0:
                 if sync_files():
                     virtu_log(f"auto_regen_loop: Replenishment complete: {successful}/{total_channels} channels updated", virtu_logINFO)
@@ -3286,6 +3869,7 @@ def auto_regen_loop():
                     virtu_log(f"auto_regen_loop: Replenishment complete: {successful}/{total_channels} channels updated, but file sync failed", virtu_logWARNING)
             else:
                 virtu_log("auto_regen_loop: No channels needed replenishment", virtu_logDEBUG)
+            release_database_connections()
         virtu_log(f"auto_regen_loop: Waiting for {auto_regen_interval} seconds", virtu_logDEBUG)
         if monitor.waitForAbort(auto_regen_interval):
             virtu_log("auto_regen_loop: Abort requested, exiting", virtu_logINFO)
@@ -3430,8 +4014,18 @@ class VirtuaTVChannel:
         self.show_time_offset = 0
         self.last_access_time = 0
         self.is_valid = False
+        self.schedule_index = None
     def set_playlist(self, filename):
-        return self.Playlist.load(filename)
+        self.schedule_index = load_schedule_index(filename)
+        return self.Playlist.load(filename, self.schedule_index)
+    def tune_to_time(self, timestamp):
+        """Point the channel at the entry on air at timestamp and the offset into it, per its schedule index."""
+        located = self.schedule_index.locate(timestamp) if self.schedule_index else None
+        if located is None:
+            return False
+        self.set_show_position(located[0])
+        self.set_show_time(located[1])
+        return True
     def set_show_position(self, show):
         show = int(show)
         self.playlist_position = self.fix_playlist_index(show)
@@ -3471,58 +4065,74 @@ class VirtuaTVChannel:
 class VirtuaTVPlaylist:
     def __init__(self):
         self.item_list = []
+        self.index = None
+        self.filename = ''
+        self.filenames = {}
+    def get_item(self, index):
+        """Entry at index; with a schedule index it comes from the sidecar rather than a parsed M3U."""
+        if not 0 <= index < self.size():
+            return None
+        if self.index is None:
+            return self.item_list[index]
+        title_data = self.index.titles[index].split('//')
+        return {
+            'duration': self.index.offsets[index + 1] - self.index.offsets[index],
+            'title': title_data[0],
+            'episode_title': title_data[1] if len(title_data) > 1 else '',
+            'description': title_data[2] if len(title_data) > 2 else ''
+        }
     def get_duration(self, index):
-        if 0 <= index < len(self.item_list):
-            return self.item_list[index]['duration']
-        return 0
+        item = self.get_item(index)
+        return item['duration'] if item else 0
     def get_filename(self, index):
-        if 0 <= index < len(self.item_list):
+        if not 0 <= index < self.size():
+            return ''
+        if self.index is None:
             return self.item_list[index]['filename']
-        return ''
+        if index not in self.filenames:
+            # Seek straight to the entry's two lines instead of reading the file up to it
+            with xbmcvfs.File(self.filename) as f:
+                f.seek(self.index.positions[index], 0)
+                entry = bytes(f.readBytes(self.index.positions[index + 1] - self.index.positions[index])).decode('utf-8')
+            lines = entry.splitlines()
+            self.filenames[index] = lines[1] if len(lines) > 1 else ''
+        return self.filenames[index]
     def get_title(self, index):
-        if 0 <= index < len(self.item_list):
-            return self.item_list[index]['title']
-        return ''
+        item = self.get_item(index)
+        return item['title'] if item else ''
     def get_episode_title(self, index):
-        if 0 <= index < len(self.item_list):
-            return self.item_list[index]['episode_title']
-        return ''
+        item = self.get_item(index)
+        return item['episode_title'] if item else ''
     def get_description(self, index):
-        if 0 <= index < len(self.item_list):
-            return self.item_list[index]['description']
-        return ''
+        item = self.get_item(index)
+        return item['description'] if item else ''
     def size(self):
-        return len(self.item_list)
-    def load(self, filename):
+        return len(self.index) if self.index is not None else len(self.item_list)
+    def load(self, filename, index=None):
         virtu_log(f"Loading playlist: {filename}", virtu_logINFO)
         self.item_list = []
+        self.index = None
+        self.filename = filename
+        self.filenames = {}
         try:
             if not xbmcvfs.exists(filename):
                 virtu_log(f"Playlist file does not exist: {filename}", virtu_logERROR)
                 return False
-            file = xbmcvfs.File(filename, 'r')
-            lines = file.read().splitlines()
-            file.close()
-            i = 0
-            while i < len(lines):
-                if lines[i].startswith('#EXTM3U'):
-                    i += 1
-                    continue
-                if lines[i].startswith('#EXTINF:'):
-                    item = {}
-                    extinf = lines[i][8:]
-                    index = extinf.find(',')
-                    if index > 0:
-                        item['duration'] = int(extinf[:index])
-                        title_data = extinf[index + 1:].split('//')
-                        item['title'] = title_data[0]
-                        item['episode_title'] = title_data[1] if len(title_data) > 1 else ''
-                        item['description'] = title_data[2] if len(title_data) > 2 else ''
-                    i += 1
-                    if i < len(lines):
-                        item['filename'] = lines[i]
-                        self.item_list.append(item)
-                i += 1
+            if index is not None:
+                self.index = index
+                return len(index) > 0
+            with xbmcvfs.File(filename) as f:
+                for entry in iter_m3u_entries(f.readBytes):
+                    if entry.path is None:
+                        continue
+                    title_data = entry.title.split('//')
+                    self.item_list.append({
+                        'duration': entry.duration,
+                        'title': title_data[0],
+                        'episode_title': title_data[1] if len(title_data) > 1 else '',
+                        'description': title_data[2] if len(title_data) > 2 else '',
+                        'filename': entry.path
+                    })
             return len(self.item_list) > 0
         except Exception as e:
             virtu_log(f"Error loading playlist {filename}: {str(e)}", virtu_logERROR)
@@ -3533,14 +4143,14 @@ def parse_m3u_for_epg(m3u_path):
     programs = []
     try:
         playlist = VirtuaTVPlaylist()
-        if playlist.load(m3u_path):
-            for index, item in enumerate(playlist.item_list):
+        if playlist.load(m3u_path, load_schedule_index(m3u_path)):
+            for index in range(playlist.size()):
+                item = playlist.get_item(index)
                 programs.append({
                     'duration': item['duration'],
                     'title': item['title'],
                     'episode_title': item['episode_title'],
-                    'description': item['description'],
-                    'filename': item['filename']
+                    'description': item['description']
                 })
         return programs
     except Exception as e:
@@ -3565,6 +4175,7 @@ def show_epg(channels=None, current_channel=0):
                 channel.m3u_path = os.path.join(storage_path, f"VirtuaTV_Channel_{ch['number']}_{''.join(c for c in ch['name'] if c.isalnum() or c in (' ', '_', '-')).replace(' ', '_')}.m3u")
                 if channel.set_playlist(channel.m3u_path):
                     channel.is_valid = True
+                    channel.tune_to_time(time.time())
                     channels.append(channel)
         if not channels:
             if xbmcgui.Dialog().yesno("VirtuaTV", "No valid channels found. Create channels or open settings?", yeslabel="Create", nolabel="Settings"):
@@ -3625,6 +4236,9 @@ def play_channel(channel_number, channels):
                 virtu_log(f"play_channel: Failed to start playback for channel {channel_number}", virtu_logERROR)
                 xbmcgui.Dialog().notification("VirtuaTV", f"Failed to start playback for channel {channel_number}", xbmcgui.NOTIFICATION_ERROR, 3000)
                 return
+            if channel.show_time_offset > 0:
+                xbmc.Player().seekTime(channel.show_time_offset)
+                virtu_log(f"play_channel: Joined channel {channel_number} {channel.show_time_offset}s into position {start_pos}", virtu_logINFO)
             with xbmcvfs.File(LAST_CHANNEL_JSON, 'w') as f:
                 json.dump({'number': channel.number, 'name': channel.name}, f)
             virtu_log(f"Saved last channel: {channel.number} - {channel.name}, starting at position {start_pos}", virtu_logINFO)
@@ -3831,7 +4445,10 @@ class VirtuaTVEPG(xbmcgui.WindowXMLDialog):
                 virtu_log("Unable to find playlist position", virtu_logERROR)
                 return
             virtu_log(f"select_show: Selecting channel {newchan}, program position {plpos}", virtu_logINFO)
-            self.channels[newchan - 1].set_show_position(plpos)
+            # The first column is what is on air now; later ones start from the beginning
+            if self.focus_index != 0 or not self.channels[newchan - 1].tune_to_time(time.time()):
+                self.channels[newchan - 1].set_show_position(plpos)
+                self.channels[newchan - 1].set_show_time(0)
             self.close()  # Close EPG before playing
             xbmcgui.Window(10000).clearProperty('VirtuaTVEPGActive')
             virtu_log("select_show: EPG closed before playing channel", virtu_logINFO)
@@ -4106,10 +4723,13 @@ if __name__ == '__main__':
                 do_nothing()
             elif action == 'clear_shared_folder':
                 clear_shared_folder()
+            elif action == 'simulate':
+                simulate(params)
             else:
                 main_menu()
         except Exception as e:
             virtu_log(f"Main execution error: {str(e)}", virtu_logERROR)
+        release_database_connections()
         virtu_log("Main execution: Plugin terminating", virtu_logINFO)
         xbmcplugin.endOfDirectory(ADDON_HANDLE, succeeded=False)
         sys.exit(0)
@@ -4125,6 +4745,8 @@ if __name__ == '__main__':
     else:
         virtu_log("auto_regen_loop not started: auto_regen disabled, service_mode not Background Service, or thread already running", virtu_logDEBUG)
 
-    # Keep settings_monitor and playback_monitor alive
+    library_monitor = LibraryMonitor()
+
+    # Keep settings_monitor, playback_monitor and library_monitor alive
     while not settings_monitor.waitForAbort(10):
         pass
\ No newline at end of file
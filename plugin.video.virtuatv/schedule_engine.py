@@ -0,0 +1,433 @@
+"""Channel schedule builder shared by full generation and append.
+
+Kept free of Kodi imports so it can be exercised and benchmarked outside Kodi.
+"""
+import bisect
+import collections
+import random
+import struct
+
+FEISTEL_ROUNDS = 4
+INDEX_MAGIC = b'VTVIDX\x00\x03'
+INDEX_FOOTER = struct.Struct('<ddQQII8s')  # anchor, M3U mtime, M3U size, total seconds, entry count, string count, magic
+INDEX_RECORD = struct.Struct('<QIQI')  # M3U byte offset, duration, seconds from anchor, title string id
+INDEX_WRITE_BUFFER = 1 << 16
+M3U_READ_CHUNK = 1 << 20
+
+M3UEntry = collections.namedtuple('M3UEntry', 'position duration title path size')
+
+
+def iter_m3u_entries(read, chunk_size=M3U_READ_CHUNK):
+    """Stream the #EXTINF entries of an M3U, reading it chunk_size bytes at a time through read(n).
+
+    Yields an M3UEntry per entry: its byte position, duration, #EXTINF title, media path and size in
+    bytes. An entry runs up to the next #EXTINF line, or the end of the file, so the sizes of consecutive
+    entries add up the way ScheduleIndex expects. Lines that belong to no entry are skipped.
+    """
+    position = 0
+    pending = None  # (position, duration, title, path) of the entry being read
+    remainder = b''
+    while True:
+        chunk = bytes(read(chunk_size))
+        if not chunk:
+            lines = [remainder] if remainder else []
+        else:
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+        for line in lines:
+            if line.startswith(b'#EXTINF:'):
+                if pending is not None:
+                    yield M3UEntry(pending[0], pending[1], pending[2], pending[3], position - pending[0])
+                info, _, title = line[8:].rstrip(b'\r').partition(b',')
+                try:
+                    duration = int(info.split(None, 1)[0]) if info.strip() else 0
+                except ValueError:
+                    duration = 0
+                pending = [position, duration, title.decode('utf-8', 'replace'), None]
+            elif pending is not None and pending[3] is None and line.strip() and not line.startswith(b'#'):
+                pending[3] = line.rstrip(b'\r').decode('utf-8', 'replace')
+            position += len(line) + 1
+        if not chunk:
+            break
+    if pending is not None:
+        # The last line has no newline when the file doesn't end with one
+        end = position - (0 if remainder == b'' else 1)
+        yield M3UEntry(pending[0], pending[1], pending[2], pending[3], end - pending[0])
+
+
+class SeededPermutation:
+    """Shuffled order of range(length) reproducible from a seed, with any position computed in O(1).
+
+    A small Feistel network permutes the smallest even-bit domain covering length and values that
+    fall outside range(length) are walked through it again, which keeps the mapping a bijection.
+    """
+
+    def __init__(self, seed, length):
+        self.seed = seed
+        self.length = length
+        bits = max(2, (length - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.keys = [(seed * 0x9E3779B1 + (round_idx + 1) * 0x7F4A7C15) & 0xFFFFFFFF for round_idx in range(FEISTEL_ROUNDS)]
+
+    def feistel(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for key in self.keys:
+            # murmur3 finalizer over the keyed half as the round function
+            mixed = right ^ key
+            mixed = ((mixed ^ (mixed >> 16)) * 0x85EBCA6B) & 0xFFFFFFFF
+            mixed = ((mixed ^ (mixed >> 13)) * 0xC2B2AE35) & 0xFFFFFFFF
+            left, right = right, left ^ ((mixed ^ (mixed >> 16)) & self.mask)
+        return (left << self.half_bits) | right
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        value = self.feistel(index)
+        while value >= self.length:
+            value = self.feistel(value)
+        return value
+
+    def __iter__(self):
+        return (self[index] for index in range(self.length))
+
+
+class IndexColumn:
+    """Read-only sequence over one field of an encoded index, decoding entries only as they are accessed."""
+
+    def __init__(self, length, getter):
+        self.length = length
+        self.getter = getter
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.getter(i) for i in range(*key.indices(self.length))]
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError(key)
+        return self.getter(key)
+
+    def __iter__(self):
+        return (self.getter(i) for i in range(self.length))
+
+
+class ScheduleIndex:
+    """Prefix sums of a channel M3U's entry durations, anchored at the wall-clock time its first entry starts.
+
+    offsets[i] is the start of entry i in seconds after anchor (a POSIX timestamp) and offsets[-1] the end
+    of the schedule, so finding what is on air at any moment is a bisect instead of a walk over the file.
+    positions[i] is the byte offset of entry i in the M3U and positions[-1] the size of the file, and
+    titles[i] the entry's #EXTINF title, so an entry can be shown or read back without parsing the file.
+    m3u_mtime is the modification time of the M3U the index was written for. Indexes are written by
+    ScheduleIndexWriter and read back with decode().
+    """
+
+    def __init__(self, anchor, offsets, positions, titles, m3u_mtime=0):
+        self.anchor = anchor
+        self.offsets = offsets
+        self.positions = positions
+        self.titles = titles
+        self.m3u_mtime = m3u_mtime
+
+    @classmethod
+    def decode(cls, data):
+        """Index over an encoded sidecar; records and titles are only unpacked when looked up."""
+        if len(data) < INDEX_FOOTER.size:
+            raise ValueError("Not a schedule index")
+        anchor, m3u_mtime, m3u_size, total, count, string_count, magic = INDEX_FOOTER.unpack_from(data, len(data) - INDEX_FOOTER.size)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a schedule index")
+        strings_start = count * INDEX_RECORD.size
+        blob_start = strings_start + (string_count + 1) * 4
+
+        def record(i):
+            return INDEX_RECORD.unpack_from(data, i * INDEX_RECORD.size)
+
+        def title(i):
+            string_id = record(i)[3]
+            start, end = struct.unpack_from('<II', data, strings_start + string_id * 4)
+            return bytes(data[blob_start + start:blob_start + end]).decode('utf-8')
+
+        return cls(
+            anchor,
+            IndexColumn(count + 1, lambda i: record(i)[2] if i < count else total),
+            IndexColumn(count + 1, lambda i: record(i)[0] if i < count else m3u_size),
+            IndexColumn(count, title),
+            m3u_mtime,
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def total_duration(self):
+        return self.offsets[-1]
+
+    @property
+    def m3u_size(self):
+        return self.positions[-1]
+
+    def elapsed_count(self, timestamp):
+        """Number of leading entries that finished playing by timestamp."""
+        return min(max(bisect.bisect_right(self.offsets, timestamp - self.anchor) - 1, 0), len(self))
+
+    def locate(self, timestamp):
+        """(entry index, seconds into it) on air at timestamp, or None once the schedule has run out."""
+        elapsed = timestamp - self.anchor
+        if not len(self) or elapsed >= self.total_duration:
+            return None
+        if elapsed < 0:
+            return 0, 0
+        index = bisect.bisect_right(self.offsets, elapsed) - 1
+        return index, elapsed - self.offsets[index]
+
+
+class ScheduleIndexWriter:
+    """Writes a ScheduleIndex in its sidecar format while the M3U it describes is being written.
+
+    Fixed-width records go out through write as entries are added, followed on close() by a string
+    table holding each distinct title once and a footer with the totals. Only the running totals and
+    that table stay in memory, however long the schedule is. anchor and m3u_mtime may be set any time
+    before close().
+    """
+
+    def __init__(self, write, anchor, start_position):
+        self.write = write
+        self.anchor = anchor
+        self.m3u_mtime = 0
+        self.m3u_size = start_position
+        self.total_duration = 0
+        self.count = 0
+        self.string_ids = {}
+        self.strings = []
+        self.buffer = bytearray()
+
+    def add(self, duration, title, size):
+        """Index the next entry: its duration in seconds, #EXTINF title and size in bytes."""
+        duration = max(duration, 0)
+        string_id = self.string_ids.get(title)
+        if string_id is None:
+            string_id = self.string_ids[title] = len(self.strings)
+            self.strings.append(title.encode('utf-8'))
+        self.buffer += INDEX_RECORD.pack(self.m3u_size, duration, self.total_duration, string_id)
+        self.m3u_size += size
+        self.total_duration += duration
+        self.count += 1
+        if len(self.buffer) >= INDEX_WRITE_BUFFER:
+            self.write(self.buffer)
+            self.buffer = bytearray()
+
+    def add_index(self, index, start=0):
+        """Index the entries of an existing ScheduleIndex from start on, as they follow in the new file."""
+        for i in range(start, len(index)):
+            self.add(index.offsets[i + 1] - index.offsets[i], index.titles[i], index.positions[i + 1] - index.positions[i])
+
+    def pad(self, size):
+        """Count size bytes written after the last entry as part of it."""
+        self.m3u_size += size
+
+    def close(self):
+        string_offsets = [0]
+        for string in self.strings:
+            string_offsets.append(string_offsets[-1] + len(string))
+        self.buffer += struct.pack(f'<{len(string_offsets)}I', *string_offsets)
+        self.buffer += b''.join(self.strings)
+        self.buffer += INDEX_FOOTER.pack(self.anchor, self.m3u_mtime, self.m3u_size, self.total_duration, self.count, len(self.strings), INDEX_MAGIC)
+        self.write(self.buffer)
+        self.buffer = bytearray()
+
+
+def new_random_order(length, rng=random):
+    """random_order state for a group of length items: the permutation seed plus the size it was drawn for."""
+    return {'seed': rng.getrandbits(32), 'length': length}
+
+
+def random_order_permutation(order, length):
+    """Permutation a stored random_order describes for a group of length items, or None if it no longer fits."""
+    if isinstance(order, dict) and order.get('length') == length and isinstance(order.get('seed'), int):
+        return SeededPermutation(order['seed'], length)
+    return None
+
+
+def migrate_random_order(order, last_index, rng=random):
+    """Seeded random_order and last_index replacing the whole shuffled index list older versions stored.
+
+    The group's cursor is moved so the episode the old list would have played next is also next in the
+    new permutation. Returns (None, last_index) when order is not a usable permutation, and the group
+    simply draws a fresh order on its next build.
+    """
+    length = len(order)
+    if not all(isinstance(index, int) for index in order) or sorted(order) != list(range(length)):
+        return None, last_index
+    next_item = order[(last_index + 1) % length] if isinstance(last_index, int) else order[0]
+    seeded = new_random_order(length, rng)
+    permutation = SeededPermutation(seeded['seed'], length)
+    position = next(position for position, index in enumerate(permutation) if index == next_item)
+    return seeded, (position - 1) % length
+
+
+class ScheduleEngine:
+    """Interleaves resolved playlists into schedule entries.
+
+    playlists[0] is the base playlist; every further playlist is inserted into each cycle of base
+    items according to its interleave low/high/count. Each playlist is a dict with 'items'
+    (ordered {group name: {'items': [...]}}), 'interleave', 'last_index' and 'shuffle_shows'.
+    An item covering several episodes carries their number as 'span' and moves its group's cursor
+    past all of them. The 'last_index' dicts are the channel's cursor state and are advanced in
+    place as entries are produced, so the caller persists them once the schedule is consumed.
+    episodes_taken counts, per playlist and group, the episodes scheduled so far.
+    Problems found along the way are collected in warnings rather than reported directly.
+    """
+
+    def __init__(self, playlists, limit_type, limit, rng=random):
+        self.playlists = playlists
+        self.limit_type = limit_type
+        self.limit = limit
+        self.rng = rng
+        self.total_items = 0
+        self.total_duration = 0
+        self.cycle_count = 0
+        self.warnings = []
+        self.indices = [
+            {item_name: max(0, playlist['last_index'].get(item_name, -1) + 1) for item_name in playlist['items']}
+            for playlist in playlists
+        ]
+        self.item_counts = [
+            {item_name: len(item_data['items']) for item_name, item_data in playlist['items'].items()}
+            for playlist in playlists
+        ]
+        self.episodes_taken = [{} for _ in playlists]
+        self.add_item_counters = {add_playlist_idx: 0 for add_playlist_idx in range(1, len(playlists))}
+        self.cycle_length = len(playlists[0]['items']) + sum(max(1, p['interleave'].get('count', 1)) for p in playlists[1:])
+        self.template = self.compile_template()
+
+    def has_room(self):
+        if self.limit_type == 'time':
+            return self.total_duration < self.limit
+        return self.total_items < self.limit
+
+    def warn(self, message):
+        if message not in self.warnings:
+            self.warnings.append(message)
+
+    def next_item(self, playlist_idx, item_name):
+        """Item at the group's cursor, advancing the cursor past all episodes it covers."""
+        playlist = self.playlists[playlist_idx]
+        num_items = self.item_counts[playlist_idx].get(item_name, 0)
+        if num_items == 0:
+            self.warn(f"No items for playlist {playlist.get('path')} group {item_name}")
+            return None, -1
+        item_idx = self.indices[playlist_idx][item_name] % num_items
+        item = playlist['items'][item_name]['items'][item_idx]
+        self.indices[playlist_idx][item_name] = (self.indices[playlist_idx][item_name] + item.get('span', 1)) % num_items
+        return item, item_idx
+
+    def take(self, playlist_idx, item_name, item, item_idx):
+        """Account for a scheduled item and move the group's last_index onto it."""
+        self.playlists[playlist_idx]['last_index'][item_name] = (item_idx + item.get('span', 1) - 1) % self.item_counts[playlist_idx][item_name]
+        self.episodes_taken[playlist_idx][item_name] = self.episodes_taken[playlist_idx].get(item_name, 0) + item.get('span', 1)
+        self.total_items += 1
+        self.total_duration += item['duration']
+        return item_name, item
+
+    def compile_template(self):
+        """Validate the interleave settings once and lay out the slots each additional playlist may use.
+
+        Returns a list of (playlist index, available groups, count, first start, last start). Playlists with
+        a fixed position have first == last; the others draw their start uniformly from the range every cycle.
+        """
+        template = []
+        for add_playlist_idx, add_playlist in enumerate(self.playlists[1:], 1):
+            available = [name for name in add_playlist['items'] if self.item_counts[add_playlist_idx][name]]
+            if not available:
+                self.warn(f"No available items for playlist {add_playlist.get('path')}")
+                continue
+            interleave = add_playlist['interleave']
+            low = interleave.get('low', 1)
+            high = interleave.get('high', 1)
+            count = max(1, interleave.get('count', 1))
+            if low < 1:
+                self.warn(f"Invalid low value {low} for playlist {add_playlist.get('path')}. Must be >= 1. Defaulting to 1.")
+                low = 1
+            if interleave.get('low') == interleave.get('high'):
+                if low > self.cycle_length:
+                    self.warn(f"Invalid low value {low} for playlist {add_playlist.get('path')}. Must be <= {self.cycle_length}. Defaulting to {self.cycle_length}.")
+                    low = self.cycle_length
+                template.append((add_playlist_idx, available, count, low, low))
+                continue
+            if high < low:
+                self.warn(f"Invalid interleave range: low ({low}) > high ({high}) for playlist {add_playlist.get('path')}. Swapping values.")
+                low, high = high, low
+            if high > self.cycle_length:
+                self.warn(f"Invalid high value {high} for playlist {add_playlist.get('path')}. Must be <= {self.cycle_length}. Defaulting to {self.cycle_length}.")
+                high = self.cycle_length
+            last_start = min(high, self.cycle_length - count + 1)
+            if last_start < low:
+                low = last_start = 1
+            template.append((add_playlist_idx, available, count, low, last_start))
+        return template
+
+    def draw_slots(self):
+        """Owner of each cycle position for this cycle; None leaves the position to the base playlist."""
+        slots = [None] * self.cycle_length
+        for add_playlist_idx, available, count, first_start, last_start in self.template:
+            start = first_start if first_start == last_start else self.rng.randint(first_start, last_start)
+            for position in range(start - 1, min(start - 1 + count, self.cycle_length)):
+                if slots[position] is None:
+                    slots[position] = add_playlist_idx
+        return slots
+
+    def entries(self):
+        """Yield (group name, item) schedule entries until the duration or item limit is reached."""
+        base_playlist = self.playlists[0]
+        while self.has_room():
+            self.cycle_count += 1
+            produced = self.total_items
+            base_items = list(base_playlist['items'].keys())
+            if base_playlist.get('shuffle_shows', False):
+                self.rng.shuffle(base_items)
+            base_cycle = []
+            for item_name in base_items:
+                if not self.has_room():
+                    break
+                item, item_idx = self.next_item(0, item_name)
+                if item is not None:
+                    base_cycle.append((item_name, item, item_idx))
+            if len(self.playlists) == 1:
+                for item_name, item, item_idx in base_cycle:
+                    yield self.take(0, item_name, item, item_idx)
+            else:
+                yield from self.interleave_cycle(base_cycle)
+            if self.total_items == produced:
+                self.warn("No schedulable items left in any playlist")
+                return
+
+    def interleave_cycle(self, base_cycle):
+        slots = self.draw_slots()
+        shuffled_available = {}
+        for add_playlist_idx, available, _, _, _ in self.template:
+            if self.playlists[add_playlist_idx].get('shuffle_shows', False):
+                available = available[:]
+                self.rng.shuffle(available)
+            shuffled_available[add_playlist_idx] = available
+        base_idx = 0
+        for owner in slots:
+            if not self.has_room():
+                return
+            if owner is not None:
+                available_items = shuffled_available[owner]
+                item_name = available_items[self.add_item_counters[owner] % len(available_items)]
+                self.add_item_counters[owner] += 1
+                item, item_idx = self.next_item(owner, item_name)
+                yield self.take(owner, item_name, item, item_idx)
+            elif base_idx < len(base_cycle):
+                item_name, item, item_idx = base_cycle[base_idx]
+                yield self.take(0, item_name, item, item_idx)
+                base_idx += 1
@@ -0,0 +1,86 @@
+"""Compare the streaming M3U parser with the read-everything parsing it replaced.
+
+Builds a synthetic channel M3U (50 MB by default), then parses it both ways and reports throughput
+and the tracemalloc peak of each. Run from the repository root:
+
+    python tools/bench_m3u_parser.py [size in MB]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'plugin.video.virtuatv'))
+from schedule_engine import iter_m3u_entries  # noqa: E402
+
+
+def write_sample(path, size_mb):
+    entry_number = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('#EXTM3U\n')
+        while f.tell() < size_mb * 1048576:
+            batch = []
+            for _ in range(1000):
+                entry_number += 1
+                season, episode = divmod(entry_number % 400, 20)
+                batch.append(
+                    f'#EXTINF:{1300 + entry_number % 900},Show {entry_number % 37}//Episode {entry_number} '
+                    f'(S{season + 1:02d}E{episode + 1:02d})//A fairly ordinary plot summary for episode {entry_number}.\n'
+                    f'smb://nas/media/tv/Show {entry_number % 37}/Season {season + 1}/Show S{season + 1:02d}E{episode + 1:02d}.mkv\n'
+                )
+            f.write(''.join(batch))
+    return entry_number
+
+
+def parse_read_all(path):
+    """What VirtuaTVPlaylist.load, update_channel_files and sync_files each did before."""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    items = []
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith('#EXTINF:'):
+            match = re.search(r'#EXTINF:(\d+)', lines[i])
+            if match and i + 1 < len(lines):
+                items.append((int(match.group(1)), lines[i].split(',', 1)[1], lines[i + 1]))
+            i += 2
+        else:
+            i += 1
+    return len(items)
+
+
+def parse_streaming(path):
+    count = 0
+    with open(path, 'rb') as f:
+        for _ in iter_m3u_entries(f.read):
+            count += 1
+    return count
+
+
+def measure(parse, path):
+    started = time.perf_counter()
+    count = parse(path)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    parse(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'bench.m3u')
+        entries = write_sample(path, size_mb)
+        file_mb = os.path.getsize(path) / 1048576
+        print(f"{file_mb:.1f} MB, {entries} entries")
+        for name, parse in (('read all + regex', parse_read_all), ('streaming', parse_streaming)):
+            count, elapsed, peak = measure(parse, path)
+            print(f"{name:>17}: {count} entries in {elapsed:.3f} s, {file_mb / elapsed:.0f} MB/s, peak {peak / 1048576:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()